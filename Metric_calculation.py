@@ -1,64 +1,75 @@
 import streamlit as st
 import pandas as pd
-from auth import load_users, save_users, hash_password
+from auth import get_user_store, hash_password
 from datetime import datetime, timedelta
+from functools import partial
 import matplotlib.pyplot as plt
 import plotly.express as px
+from ingest import normalize_disconnected_df
+from dataset_registry import get_registry, session_dataset
+from perf import begin_run, finish_run, get_recorder, runs_jsonl, stage, stage_frame, stage_percentiles, tag_run
+from gateway_outage import gateway_outages, daily_gateway_outage_counts
+from gateway_topology import GatewayTopology
+from metrics_grid import leaderboard
+from downsample import lttb, weekly_peaks
+from result_cache import get_result_cache
+from streaks import DEVICE_ATTRIBUTES, device_runs, gateway_runs, summarize_runs
 
 def format_date(dt):
     return dt.strftime("%d-%m-%Y")
 
 def preprocess_disconnected_df(disconnected_df, master_df):
-    disconnected_df.columns = disconnected_df.columns.str.strip()  # Clean column names
-    if "entry_date" not in disconnected_df.columns:
-        st.error("Column 'entry_date' not found in disconnected device file.")
+    # Uploads are normalized once at ingest (see ingest.py); this wrapper only
+    # reports problems for callers holding a raw export
+    try:
+        return normalize_disconnected_df(disconnected_df, master_df)
+    except ValueError as e:
+        st.error(str(e))
         st.stop()
 
-    # Clean and normalize entry_date
-    disconnected_df["entry_date"] = (
-        disconnected_df["entry_date"]
-        .astype(str)
-        .str.strip()
-        .str.replace(r"\s+", "", regex=True)
-    )
-    
-    disconnected_df["entry_date"] = pd.to_datetime(
-        disconnected_df["entry_date"], dayfirst=True, errors="coerce"
-    )
 
-    if disconnected_df["entry_date"].isna().all():
-        st.error("All dates in 'entry_date' failed to parse. Ensure format is DD-MM-YYYY or clean invisible characters.")
-        st.stop()
+# Columns read from the history for the device list and gateway check, and
+# for the trend window
+DEVICE_LIST_COLUMNS = ["entry_date", "farm_name", "deviceid", "tag_number", "data_quality"]
+TREND_COLUMNS = ["entry_date", "farm_name", "Cluster", "deviceid", "Device_type", "data_quality"]
 
-    cluster_map = master_df.set_index("farm_name")["Cluster"].to_dict()
-    disconnected_df["Cluster"] = disconnected_df["farm_name"].map(cluster_map)
-    return disconnected_df
 
-
-def calculate_metrics(master_df, device_df, disconnected_df, selected_cluster, selected_farm, selected_date):
-    # Preprocess the disconnected dataframe
-    disconnected_df = preprocess_disconnected_df(disconnected_df, master_df)
-    
-    # Normalize device types and data quality for case-insensitive comparison
-    disconnected_df["Device_type_normalized"] = disconnected_df["Device_type"].astype(str).str.strip().str.lower()
-    disconnected_df["data_quality_normalized"] = disconnected_df["data_quality"].astype(str).str.strip().str.lower()
+def calculate_metrics(master_df, device_df, disconnected_df, selected_cluster, selected_farm, selected_date, cube=None, allowed_farms=None, date_index=None, topology=None):
+    # disconnected_df is already normalized at ingest: entry_date parsed,
+    # Device_type/data_quality lower-cased and Cluster joined in.
+    # When a MetricsCube is given the counts come from it and disconnected_df
+    # is only scanned for the device list and gateway checks.
+    # allowed_farms limits the shared, unfiltered history after the date slice.
+    # date_index (built over the same sorted history) turns the date filter
+    # into a binary-search slice, or into a query when the history is on
+    # disk or in appended segments and disconnected_df is None. topology is the GatewayTopology of
+    # the whole inventory; without it one is built from the filtered device_df.
 
     # Filter data by selected date
-    selected_date_obj = pd.to_datetime(selected_date, format="%d-%m-%Y").date()
-    date_filtered = disconnected_df[
-        (disconnected_df["entry_date"].dt.date == selected_date_obj)
-    ]
+    selected_day = pd.to_datetime(selected_date, format="%d-%m-%Y")
+    if date_index is not None:
+        # With a cube only the disconnected rows are read
+        date_filtered = date_index.day(
+            disconnected_df, selected_day, farms=allowed_farms, disconnected_only=cube is not None,
+            columns=DEVICE_LIST_COLUMNS if cube is not None else None,
+        )
+    else:
+        date_filtered = disconnected_df[
+            (disconnected_df["entry_date"] >= selected_day) &
+            (disconnected_df["entry_date"] < selected_day + timedelta(days=1))
+        ]
+        if allowed_farms is not None:
+            date_filtered = date_filtered[date_filtered["farm_name"].isin(allowed_farms)]
     
     # Filter for disconnected devices only
     filtered_disconnected = date_filtered[
-        (date_filtered["data_quality_normalized"] == "disconnected")
+        (date_filtered["data_quality"] == "disconnected")
     ]
 
     # Apply cluster filter if specified
     if selected_cluster != "All":
         master_df = master_df[master_df["Cluster"] == selected_cluster]
         device_df = device_df[device_df["farm_name"].isin(master_df["farm_name"])]
-        disconnected_df = disconnected_df[disconnected_df["farm_name"].isin(master_df["farm_name"])]
         date_filtered = date_filtered[date_filtered["farm_name"].isin(master_df["farm_name"])]
         filtered_disconnected = filtered_disconnected[filtered_disconnected["farm_name"].isin(master_df["farm_name"])]
 
@@ -66,19 +77,31 @@ def calculate_metrics(master_df, device_df, disconnected_df, selected_cluster, s
     if selected_farm != "All":
         master_df = master_df[master_df["farm_name"] == selected_farm]
         device_df = device_df[device_df["farm_name"] == selected_farm]
-        disconnected_df = disconnected_df[disconnected_df["farm_name"] == selected_farm]
         date_filtered = date_filtered[date_filtered["farm_name"] == selected_farm]
         filtered_disconnected = filtered_disconnected[filtered_disconnected["farm_name"] == selected_farm]
 
     # Calculate total farms
     total_farms = master_df["farm_name"].nunique()
 
+    # Farms of the selection; None means every farm
+    farms = master_df["farm_name"] if selected_cluster != "All" or selected_farm != "All" else allowed_farms
+
+    if cube is not None:
+        counts = cube.day_counts(selected_day, farms)
+    else:
+        counts = {
+            "total_devices": date_filtered["deviceid"].nunique(),
+            "disconnected_devices": filtered_disconnected["deviceid"].nunique(),
+            "type_rows": date_filtered["Device_type"].value_counts().to_dict(),
+            "disconnected_type_rows": filtered_disconnected["Device_type"].value_counts().to_dict(),
+        }
+
     # Calculate total devices (all devices on selected date)
-    total_devices = date_filtered["deviceid"].nunique()
+    total_devices = counts["total_devices"]
 
     # Calculate device type counts (all devices on selected date)
-    b_type_count = len(date_filtered[date_filtered["Device_type_normalized"] == "b type"])
-    c_type_count = len(date_filtered[date_filtered["Device_type_normalized"] == "c type"])
+    b_type_count = int(counts["type_rows"].get("b type", 0))
+    c_type_count = int(counts["type_rows"].get("c type", 0))
     a_type_count = total_devices - (b_type_count + c_type_count)
 
     device_type_counts = {
@@ -88,12 +111,19 @@ def calculate_metrics(master_df, device_df, disconnected_df, selected_cluster, s
     }
 
     # Calculate disconnected devices
-    disconnected_devices = filtered_disconnected["deviceid"].nunique()
-    disconnected_list = filtered_disconnected[["deviceid", "tag_number"]].dropna().drop_duplicates().values.tolist()
+    disconnected_devices = counts["disconnected_devices"]
+    # Kept columnar; plain strings so the table does not carry the shared
+    # id dictionaries of the compact schema
+    disconnected_table = (
+        filtered_disconnected[["deviceid", "tag_number"]].dropna().drop_duplicates()
+        .astype(str)
+        .rename(columns={"deviceid": "Device ID", "tag_number": "Tag Number"})
+        .reset_index(drop=True)
+    )
 
     # Calculate disconnected type counts
-    b_type_disconnected = len(filtered_disconnected[filtered_disconnected["Device_type_normalized"] == "b type"])
-    c_type_disconnected = len(filtered_disconnected[filtered_disconnected["Device_type_normalized"] == "c type"])
+    b_type_disconnected = int(counts["disconnected_type_rows"].get("b type", 0))
+    c_type_disconnected = int(counts["disconnected_type_rows"].get("c type", 0))
     a_type_disconnected = disconnected_devices - (b_type_disconnected + c_type_disconnected)
 
     disconnected_type_counts = {
@@ -104,10 +134,15 @@ def calculate_metrics(master_df, device_df, disconnected_df, selected_cluster, s
 
     # Gateway calculations
     gateway_count = device_df["gatewayid"].nunique()
-    gateway_devices = device_df.groupby("gatewayid")["deviceid"].apply(set).to_dict()
-    disconnected_set = set(filtered_disconnected["deviceid"])
-
-    gateway_issues = [g for g, devs in gateway_devices.items() if devs.issubset(disconnected_set) and devs]
+    if topology is None:
+        topology = GatewayTopology(device_df, master_df)
+        segments = topology.segments()
+    else:
+        segments = topology.segments(farms, selected_cluster, selected_farm)
+    gateway_status = topology.gateway_status(filtered_disconnected["deviceid"], segments)
+    gateway_issues = gateway_status.loc[
+        gateway_status["disconnected_devices"] == gateway_status["gateway_devices"], "gatewayid"
+    ].tolist()
     gateway_issue_flag = "Yes" if len(gateway_issues) > 0 else "No"
     gateway_issue_count = len(gateway_issues)
 
@@ -117,24 +152,39 @@ def calculate_metrics(master_df, device_df, disconnected_df, selected_cluster, s
         "disconnected_devices": disconnected_devices,
         "gateway_issue": gateway_issue_flag,
         "gateway_count": gateway_count,
-        "disconnected_list": disconnected_list,
+        "disconnected_table": disconnected_table,
         "disconnected_gateway_count": gateway_issue_count,
         "device_type_counts": device_type_counts,
         "disconnected_type_counts": disconnected_type_counts,
-        "gateway_issues_list": gateway_issues
+        "gateway_issues_list": gateway_issues,
+        "gateway_status": gateway_status
     }
 
 
-def get_trend_data(disconnected_df, device_df, master_df, selected_cluster, selected_farm, selected_device_type, period_days):
-    disconnected_df = preprocess_disconnected_df(disconnected_df, master_df)
-
-    end_date = disconnected_df["entry_date"].max().normalize()
+def get_trend_data(disconnected_df, device_df, master_df, selected_cluster, selected_farm, selected_device_type, period_days, cube=None, allowed_farms=None, outages=None, date_index=None):
+    # outages, when given, are per-(gateway, day) results precomputed for
+    # exactly the rows and inventory selected here (see Dataset.gateway_outages)
+    if cube is not None:
+        end_date = cube.days(allowed_farms).max()
+    elif allowed_farms is not None:
+        end_date = disconnected_df.loc[disconnected_df["farm_name"].isin(allowed_farms), "entry_date"].max().normalize()
+    elif date_index is not None:
+        end_date = date_index.days.max()
+    else:
+        end_date = disconnected_df["entry_date"].max().normalize()
     start_date = end_date - timedelta(days=period_days)
-    trend_df = disconnected_df[
-        (disconnected_df["entry_date"] >= start_date) &
-        (disconnected_df["entry_date"] <= end_date) &
-        (disconnected_df["data_quality"] == "Disconnected")
-    ]
+    if date_index is not None:
+        trend_df = date_index.between(
+            disconnected_df, start_date, end_date, farms=allowed_farms, disconnected_only=True, columns=TREND_COLUMNS
+        )
+    else:
+        trend_df = disconnected_df[
+            (disconnected_df["entry_date"] >= start_date) &
+            (disconnected_df["entry_date"] <= end_date)
+        ]
+        trend_df = trend_df[trend_df["data_quality"] == "disconnected"]
+        if allowed_farms is not None:
+            trend_df = trend_df[trend_df["farm_name"].isin(allowed_farms)]
 
     if selected_cluster != "All":
         trend_df = trend_df[trend_df["Cluster"] == selected_cluster]
@@ -143,45 +193,86 @@ def get_trend_data(disconnected_df, device_df, master_df, selected_cluster, sele
     if selected_device_type != "All":
         trend_df = trend_df[trend_df["Device_type"] == selected_device_type]
 
-    device_trend = trend_df.groupby("entry_date")["deviceid"].nunique().reset_index(name="Disconnected Devices")
+    if cube is not None:
+        trend_cube = cube.restrict(allowed_farms) if allowed_farms is not None else cube
+        device_trend = trend_cube.device_trend(start_date, end_date, selected_cluster, selected_farm, selected_device_type)
+    else:
+        device_trend = trend_df.groupby("entry_date")["deviceid"].nunique().reset_index(name="Disconnected Devices")
 
-    gateway_issues = []
-    for date in pd.date_range(start=start_date, end=end_date):
-        day_data = trend_df[trend_df["entry_date"].dt.date == date.date()]
-        disconnected_set = set(day_data["deviceid"])
-        filtered_device = device_df.copy()
+    # Gateway outages for every day in one grouped pass over the window
+    if outages is None:
+        filtered_device = device_df
         if selected_farm != "All":
             filtered_device = filtered_device[filtered_device["farm_name"] == selected_farm]
-        gateway_devices = filtered_device.groupby("gatewayid")["deviceid"].apply(set).to_dict()
-        gateway_issue_count = sum(1 for devs in gateway_devices.values() if devs.issubset(disconnected_set))
-        gateway_issues.append({"entry_date": date, "Disconnected Gateways": gateway_issue_count})
-    gateway_trend = pd.DataFrame(gateway_issues)
+        outages = gateway_outages(trend_df, filtered_device)
+    gateway_trend = daily_gateway_outage_counts(outages, start_date, end_date)
 
     return device_trend, gateway_trend
 
-def plot_trends(device_df, gateway_df):
+# Trends have one point per day, at most 366. "Auto" downsamples the 6-month
+# and 1-year series to this many points; shorter ones are drawn as they are
+TREND_POINT_BUDGET = 150
+# Series longer than this (a daily 1-year trend) are drawn with WebGL and
+# without markers instead of as SVG
+WEBGL_POINT_THRESHOLD = 200
+TREND_RESOLUTIONS = ["Auto", "Daily", "Weekly"]
+
+def resample_trend(df, column, resolution):
+    if resolution == "Weekly":
+        return weekly_peaks(df, "entry_date", column)
+    if resolution == "Auto":
+        return lttb(df, "entry_date", column, TREND_POINT_BUDGET)
+    return df
+
+def trend_figure(df, column, title, axis_label, color=None):
+    large = len(df) > WEBGL_POINT_THRESHOLD
+    fig = px.line(df, x="entry_date", y=column,
+                  title=title,
+                  labels={"entry_date": "Date", column: axis_label},
+                  color_discrete_sequence=[color] if color else None,
+                  render_mode="webgl" if large else "svg")
+    fig.update_traces(mode="lines" if large else "markers+lines")
+    fig.update_layout(hovermode="x unified")
+    return fig
+
+def build_trend_figures(device_df, gateway_df, resolution="Auto"):
+    suffix = " (weekly peak)" if resolution == "Weekly" else ""
+    fig1 = trend_figure(resample_trend(device_df, "Disconnected Devices", resolution),
+                        "Disconnected Devices", "Device Disconnection Trend" + suffix, "Devices")
+    fig2 = trend_figure(resample_trend(gateway_df, "Disconnected Gateways", resolution),
+                        "Disconnected Gateways", "Gateway Disconnection Trend" + suffix, "Gateways", color="red")
+    return fig1, fig2
+
+@st.cache_resource(max_entries=64, show_spinner=False)
+def cached_trend_figures(cache_key, resolution, _device_df, _gateway_df):
+    # cache_key (dataset version and filters) identifies the trend data,
+    # which is left out of the hash
+    return build_trend_figures(_device_df, _gateway_df, resolution)
+
+def plot_trends(device_df, gateway_df, resolution="Auto", cache_key=None):
     # Use Plotly for interactive plots
-    fig1 = px.line(device_df, x="entry_date", y="Disconnected Devices", 
-                  title="Device Disconnection Trend",
-                  labels={"entry_date": "Date", "Disconnected Devices": "Devices"})
-    fig1.update_traces(mode="markers+lines")
-    fig1.update_layout(hovermode="x unified")
-    
-    fig2 = px.line(gateway_df, x="entry_date", y="Disconnected Gateways", 
-                  title="Gateway Disconnection Trend",
-                  labels={"entry_date": "Date", "Disconnected Gateways": "Gateways"},
-                  color_discrete_sequence=["red"])
-    fig2.update_traces(mode="markers+lines")
-    fig2.update_layout(hovermode="x unified")
-    
+    if cache_key is not None:
+        fig1, fig2 = cached_trend_figures(cache_key, resolution, device_df, gateway_df)
+    else:
+        fig1, fig2 = build_trend_figures(device_df, gateway_df, resolution)
+
     st.plotly_chart(fig1, use_container_width=True)
     st.plotly_chart(fig2, use_container_width=True)
 
 def user_dashboard():
-    # Load session state data
-    master_df = st.session_state.master_df
-    device_df = st.session_state.device_df
-    disconnected_df = st.session_state.disconnected_df
+    # The dataset is shared read-only across sessions; reruns only take
+    # filtered views of it and never modify it
+    begin_run("User Dashboard")
+    with stage("load_dataset"):
+        dataset = session_dataset()
+    if dataset is None:
+        st.session_state.files_uploaded = False
+        st.error("The selected dataset is no longer available. Please upload the files again.")
+        st.stop()
+    master_df = dataset.master_df
+    device_df = dataset.device_df
+    disconnected_df = dataset.disconnected_df
+    cube = dataset.cube
 
     # Farm status filter (BEFORE dropdowns)
     status_list = ["All"] + sorted(master_df["farm_status"].dropna().unique())
@@ -190,19 +281,17 @@ def user_dashboard():
     if selected_status != "All":
         master_df = master_df[master_df["farm_status"] == selected_status]
     
-    # Sync device_df and disconnected_df
+    # Sync device_df; the disconnected history is limited to these farms only
+    # after it has been sliced by date inside the metric functions
     allowed_farms = master_df["farm_name"].unique()
     device_df = device_df[device_df["farm_name"].isin(allowed_farms)]
-    disconnected_df = disconnected_df[disconnected_df["farm_name"].isin(allowed_farms)]
 
     st.title("User Dashboard")
 
-    # Preprocess for date list
-    disconnected_df = preprocess_disconnected_df(disconnected_df, master_df)
-    date_list = sorted(disconnected_df["entry_date"].dropna().dt.date.unique(), reverse=True)
-
-    # After filtering master_df and disconnected_df (see issue 2 first!)
-    date_list = sorted(disconnected_df["entry_date"].dropna().dt.date.unique())
+    # Dates come from the date index; a status filter narrows them via the cube
+    with stage("date_list"):
+        days = dataset.date_index.days if selected_status == "All" else cube.days(allowed_farms)
+        date_list = [day.date() for day in days]
 
     if date_list:
         col1, col2 = st.columns(2)
@@ -233,32 +322,35 @@ def user_dashboard():
         st.error("No valid dates found in disconnected device file. Please check data format.")
         st.stop()
 
-    # Apply filter to master_df and disconnected_df
-    if selected_status != "All":
-        master_df = master_df[master_df["farm_status"] == selected_status]
-    disconnected_df = disconnected_df[disconnected_df["farm_name"].isin(master_df["farm_name"])]
-
-    # Recompute date list post filtering
-    disconnected_df = preprocess_disconnected_df(disconnected_df, master_df)
-    date_list = sorted(disconnected_df["entry_date"].dropna().dt.date.unique(), reverse=True)
-
     # Display Farm Info
     st.markdown("### 🏡 Farm Info")
-if selected_farm != "All":
-    vcm_name = master_df[master_df["farm_name"] == selected_farm]["vcm_name"].values[0]
-else:
-    vcm_name = "N/A"
-
-st.markdown(
-    f"<div style='display: flex; gap: 3rem;'>"
-    f"<b>Farm Name:</b> {selected_farm} &nbsp;&nbsp;"
-    f"<b>Cluster:</b> {selected_cluster} &nbsp;&nbsp;"
-    f"<b>VCM Name:</b> {vcm_name}"
-    f"</div>",
-    unsafe_allow_html=True
-)
-
-    metrics = calculate_metrics(master_df, device_df, disconnected_df, selected_cluster, selected_farm, selected_date)
+    if selected_farm != "All":
+        vcm_name = master_df[master_df["farm_name"] == selected_farm]["vcm_name"].values[0]
+    else:
+        vcm_name = "N/A"
+
+    st.markdown(
+        f"<div style='display: flex; gap: 3rem;'>"
+        f"<b>Farm Name:</b> {selected_farm} &nbsp;&nbsp;"
+        f"<b>Cluster:</b> {selected_cluster} &nbsp;&nbsp;"
+        f"<b>VCM Name:</b> {vcm_name}"
+        f"</div>",
+        unsafe_allow_html=True
+    )
+
+    tag_run(status=selected_status, cluster=selected_cluster, farm=selected_farm, date=selected_date)
+    # Results are shared across sessions through the result cache; keys carry
+    # the dataset version, so a new upload never hits stale entries
+    result_cache = get_result_cache()
+    with stage("calculate_metrics"):
+        metrics = result_cache.get_or_compute(
+            ("metrics", dataset.version, selected_status, selected_cluster, selected_farm, selected_date),
+            lambda: calculate_metrics(
+                master_df, device_df, disconnected_df, selected_cluster, selected_farm, selected_date,
+                cube=cube, allowed_farms=allowed_farms, date_index=dataset.date_index,
+                topology=dataset.topology
+            ),
+        )
 
     # Device Statistics Section
     st.subheader("📊 Device Statistics")
@@ -289,13 +381,23 @@ st.markdown(
     else:
         cols[2].markdown(f'<p style="font-size:20px;color:black">Gateway Issue: {metrics["gateway_issue"]}</p>', unsafe_allow_html=True)
 
-    # Disconnected Devices List
-    st.subheader("📋 Disconnected Devices List")
-    if metrics["disconnected_list"]:
-        df = pd.DataFrame(metrics["disconnected_list"], columns=["Device ID", "Tag Number"])
-        st.dataframe(df)
-    else:
-        st.info("No disconnected devices found.")
+    affected = metrics["gateway_status"]
+    affected = affected[affected["disconnected_devices"] > 0].sort_values(
+        ["down_ratio", "disconnected_devices"], ascending=False
+    )
+    with st.expander(f"Gateways with disconnected devices ({len(affected):,})"):
+        st.dataframe(
+            affected.assign(down_ratio=affected["down_ratio"] * 100).rename(columns={
+                "gatewayid": "Gateway ID", "gateway_devices": "Devices",
+                "disconnected_devices": "Disconnected", "down_ratio": "Down %",
+            }),
+            hide_index=True,
+            column_config={"Down %": st.column_config.NumberColumn(format="%.0f")},
+        )
+
+    disconnected_devices_section(metrics["disconnected_table"], selected_date)
+
+    leaderboard_section(dataset, selected_status, selected_date, selected_cluster, allowed_farms)
 
     # Trend Analysis Section
     st.subheader("📉 Trend Analysis")
@@ -307,23 +409,208 @@ st.markdown(
         "1 year": 365
     }
 
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
     with col1:
         selected_period = st.selectbox("Trend Duration", list(period_map.keys()))
+    with col3:
+        resolution = st.selectbox(
+            "Resolution", TREND_RESOLUTIONS, key="trend_resolution",
+            help=f"Auto keeps at most {TREND_POINT_BUDGET} points per chart"
+        )
     with col2:
-        selected_device_type = st.selectbox("Device Type", ["All"] + sorted(disconnected_df["Device_type"].dropna().unique().tolist()))
-
-    device_trend, gateway_trend = get_trend_data(
-        disconnected_df, device_df, master_df,
-        selected_cluster, selected_farm,
-        selected_device_type, period_map[selected_period]
-    )
+        # Device types are lower-cased at ingest; show them title-cased
+        selected_device_type = st.selectbox(
+            "Device Type", ["All"] + sorted(cube.cells["Device_type"].dropna().unique().tolist()),
+            format_func=lambda value: value if value == "All" else value.title()
+        )
+
+    # The unfiltered view reuses the gateway outages precomputed for the dataset
+    unfiltered = (selected_status, selected_cluster, selected_farm, selected_device_type) == ("All",) * 4
+
+    tag_run(period=selected_period, device_type=selected_device_type)
+    with stage("get_trend_data"):
+        device_trend, gateway_trend = result_cache.get_or_compute(
+            ("trend", dataset.version, selected_status, selected_cluster, selected_farm,
+             selected_device_type, selected_period),
+            lambda: get_trend_data(
+                disconnected_df, device_df, master_df,
+                selected_cluster, selected_farm,
+                selected_device_type, period_map[selected_period], cube=cube, allowed_farms=allowed_farms,
+                outages=dataset.gateway_outages if unfiltered else None, date_index=dataset.date_index
+            ),
+        )
 
     if not device_trend.empty or not gateway_trend.empty:
-        plot_trends(device_trend, gateway_trend)
+        with stage("plot_trends"):
+            plot_trends(
+                device_trend, gateway_trend, resolution,
+                cache_key=(dataset.version, selected_status, selected_cluster, selected_farm,
+                           selected_device_type, selected_period),
+            )
     else:
         st.info("No trend data available.")
 
+    streaks_section(dataset, selected_cluster, selected_farm, selected_device_type, allowed_farms)
+    finish_run()
+
+
+DEVICE_PAGE_SIZES = [25, 50, 100, 500]
+
+def search_devices(table, text):
+    """Rows whose device id or tag number contains the text, ignoring case."""
+    matches = table["Device ID"].str.contains(text, case=False, regex=False)
+    matches |= table["Tag Number"].str.contains(text, case=False, regex=False)
+    return table[matches]
+
+def disconnected_devices_section(table, selected_date):
+    # Only the current page is sent to the browser
+    st.subheader("📋 Disconnected Devices List")
+    if table.empty:
+        st.info("No disconnected devices found.")
+        return
+
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        search = st.text_input("Search Device ID or Tag Number", key="device_search").strip()
+    if search:
+        table = search_devices(table, search)
+    with col2:
+        page_size = st.selectbox("Rows per page", DEVICE_PAGE_SIZES, key="device_page_size")
+    page_count = max(1, -(-len(table) // page_size))
+    with col3:
+        page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1, key="device_page")
+
+    start = (page - 1) * page_size
+    st.dataframe(table.iloc[start:start + page_size], hide_index=True)
+    st.caption(f"{len(table):,} devices")
+    # The CSV is only built when the button is clicked
+    st.download_button(
+        "Export CSV", partial(table.to_csv, index=False),
+        file_name=f"disconnected_devices_{selected_date}.csv", mime="text/csv"
+    )
+
+LEADERBOARD_COLUMNS = {
+    "farm_name": "Farm",
+    "Cluster": "Cluster",
+    "total_devices": "Total Devices",
+    "a_type_devices": "A Devices",
+    "b_type_devices": "B Devices",
+    "c_type_devices": "C Devices",
+    "disconnected_devices": "Disconnected Devices",
+    "a_type_disconnected": "Disconnected A",
+    "b_type_disconnected": "Disconnected B",
+    "c_type_disconnected": "Disconnected C",
+    "gateway_count": "Total Gateways",
+    "disconnected_gateways": "Disconnected Gateways",
+    "disconnection_rate": "Disconnection Rate %",
+}
+
+
+def ranked_leaderboard(dataset, selected_date, level, allowed_farms):
+    board = leaderboard(
+        dataset, pd.to_datetime(selected_date, format="%d-%m-%Y"),
+        by="farm" if level == "Farms" else "cluster", farms=allowed_farms,
+    )
+    if level == "Clusters":
+        board = board.drop(columns="farm_name")
+    board = board.sort_values(["disconnection_rate", "disconnected_devices"], ascending=False)
+    return board[[column for column in LEADERBOARD_COLUMNS if column in board.columns]]
+
+
+def leaderboard_section(dataset, selected_status, selected_date, selected_cluster, allowed_farms):
+    # Every farm (or cluster) on the selected date from one grouped pass,
+    # shared through the result cache; reruns only apply the filters below
+    st.subheader("🏆 Leaderboard")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        level = st.radio("Rank", ["Farms", "Clusters"], horizontal=True, key="leaderboard_level")
+    with col2:
+        search = st.text_input("Search", key="leaderboard_search").strip()
+    with col3:
+        only_affected = st.checkbox("Only with disconnections", key="leaderboard_affected")
+
+    with stage("leaderboard"):
+        board = get_result_cache().get_or_compute(
+            ("leaderboard", dataset.version, selected_status, selected_date, level),
+            lambda: ranked_leaderboard(dataset, selected_date, level, allowed_farms),
+        )
+        if level == "Farms" and selected_cluster != "All":
+            board = board[board["Cluster"] == selected_cluster]
+        if search:
+            name = board["farm_name"] if level == "Farms" else board["Cluster"]
+            board = board[name.astype(str).str.contains(search, case=False, regex=False)]
+        if only_affected:
+            board = board[board["disconnected_devices"] > 0]
+
+    if board.empty:
+        st.info("No farms match the filters.")
+        return
+    # Column headers sort the table in the browser
+    st.dataframe(
+        board.rename(columns=LEADERBOARD_COLUMNS),
+        hide_index=True,
+        column_config={"Disconnection Rate %": st.column_config.NumberColumn(format="%.1f")},
+    )
+
+
+STREAK_COLUMNS = {
+    "deviceid": "Device ID",
+    "gatewayid": "Gateway ID",
+    "tag_number": "Tag Number",
+    "farm_name": "Farm",
+    "Cluster": "Cluster",
+    "Device_type": "Device Type",
+    "current_streak": "Current Streak (days)",
+    "longest_streak": "Longest Streak (days)",
+    "outages": "Outages",
+    "mttr_days": "MTTR (days)",
+    "last_disconnected": "Last Disconnected",
+}
+
+
+def filter_runs(runs, allowed_farms, selected_cluster, selected_farm, selected_device_type="All"):
+    runs = runs[runs["farm_name"].isin(allowed_farms)]
+    if selected_cluster != "All":
+        runs = runs[runs["Cluster"] == selected_cluster]
+    if selected_farm != "All":
+        runs = runs[runs["farm_name"] == selected_farm]
+    if selected_device_type != "All":
+        runs = runs[runs["Device_type"] == selected_device_type]
+    return runs
+
+
+def streaks_section(dataset, selected_cluster, selected_farm, selected_device_type, allowed_farms):
+    # Runs are computed once per dataset version; filters only slice them
+    st.subheader("⏱️ Outage Streaks")
+    result_cache = get_result_cache()
+    with stage("streaks"):
+        devices = result_cache.get_or_compute(("device_runs", dataset.version), lambda: device_runs(dataset))
+        gateways = result_cache.get_or_compute(("gateway_runs", dataset.version), lambda: gateway_runs(dataset))
+        devices = filter_runs(devices, allowed_farms, selected_cluster, selected_farm, selected_device_type)
+        gateways = filter_runs(gateways, allowed_farms, selected_cluster, selected_farm)
+
+    min_streak = st.number_input("Disconnected for at least (consecutive days)", min_value=1, value=3, key="streak_min")
+    tab1, tab2, tab3 = st.tabs(["Devices", "Gateways", "MTTR by Farm"])
+    with tab1:
+        summary = summarize_runs(devices, ["deviceid"] + DEVICE_ATTRIBUTES)
+        current = summary[summary["current_streak"] >= min_streak].sort_values("current_streak", ascending=False)
+        st.caption(f"{len(current):,} devices currently disconnected for {min_streak}+ days")
+        st.dataframe(current.rename(columns=STREAK_COLUMNS), hide_index=True)
+    with tab2:
+        summary = summarize_runs(gateways, ["gatewayid", "farm_name", "Cluster"])
+        current = summary[summary["current_streak"] >= min_streak].sort_values("current_streak", ascending=False)
+        st.caption(f"{len(current):,} gateways currently fully down for {min_streak}+ days")
+        st.dataframe(current.rename(columns=STREAK_COLUMNS), hide_index=True)
+    with tab3:
+        # Device outages that have ended, averaged per farm
+        by_farm = summarize_runs(devices, ["farm_name", "Cluster"])
+        by_farm = by_farm[["farm_name", "Cluster", "outages", "mttr_days", "longest_streak"]]
+        st.dataframe(
+            by_farm.sort_values("mttr_days", ascending=False).rename(columns=STREAK_COLUMNS),
+            hide_index=True,
+            column_config={"MTTR (days)": st.column_config.NumberColumn(format="%.1f")},
+        )
+
 
 def admin_dashboard(show=True):
     # Create tabs for navigation
@@ -335,30 +622,96 @@ def admin_dashboard(show=True):
     with tab2:
         admin_panel()
 
+def result_cache_section():
+    st.subheader("Result Cache")
+    result_cache = get_result_cache()
+    stats = result_cache.stats()
+    cols = st.columns(4)
+    cols[0].metric("Entries", stats["entries"])
+    cols[1].metric("Hit Rate", f"{stats['hit_rate']:.0%}", help=f"{stats['hits']} hits, {stats['misses']} misses")
+    cols[2].metric("Memory", f"{stats['bytes'] / 1024 ** 2:.1f} MB", help=f"Budget {stats['max_bytes'] / 1024 ** 2:.0f} MB")
+    cols[3].metric("Evictions", stats["evictions"])
+    if st.button("Clear Result Cache"):
+        result_cache.clear()
+        st.rerun()
+
+def performance_section():
+    st.subheader("Performance")
+    recorder = get_recorder()
+    enabled = st.checkbox("Record stage timings", value=recorder.enabled, key="perf_enabled")
+    if enabled != recorder.enabled:
+        recorder.set_enabled(enabled)
+
+    runs = recorder.runs()
+    if not runs:
+        st.info("No reruns recorded yet." if enabled else "Recording is off.")
+        return
+
+    st.markdown(f"**Stage percentiles** over the last {len(runs)} reruns")
+    st.dataframe(stage_percentiles(runs), hide_index=True)
+    st.markdown("**Recent stages**")
+    st.dataframe(stage_frame(runs[-20:]).iloc[::-1], hide_index=True)
+
+    col1, col2 = st.columns(2)
+    col1.download_button(
+        "Export JSON Lines", runs_jsonl(runs), file_name="stage_timings.jsonl", mime="application/json"
+    )
+    if col2.button("Clear History"):
+        recorder.clear()
+        st.rerun()
+
+USERS_PER_PAGE = 25
+
 def admin_panel():
     st.title("Admin Panel")
-    users = load_users()
+
+    st.subheader("Datasets in Memory")
+    registry = get_registry()
+    usage = registry.usage()
+    if usage:
+        st.dataframe(pd.DataFrame(
+            [{"Version": version, "Sessions": sessions} for version, sessions in usage.items()]
+        ))
+    else:
+        st.info("No datasets loaded.")
+    if st.button("Evict Unused Datasets"):
+        evicted = registry.evict_unused()
+        get_result_cache().invalidate(evicted)
+        st.success(f"Evicted {len(evicted)} dataset(s).")
+
+    result_cache_section()
+    performance_section()
+
+    dataset = session_dataset()
+    if dataset is not None and dataset.memory_report is not None:
+        st.subheader("Memory Report")
+        report = dataset.memory_report
+        st.caption(
+            f"Compact schema: {report['Bytes Before'].sum():,} bytes before, "
+            f"{report['Bytes After'].sum():,} bytes after"
+        )
+        st.dataframe(report, hide_index=True)
+
+    store = get_user_store()
     st.subheader("User Management")
-    for username, details in users.items():
+    user_count = store.count()
+    page_count = max(1, -(-user_count // USERS_PER_PAGE))
+    page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1, key="user_page")
+    st.caption(f"{user_count} users")
+    for username, role in store.page((page - 1) * USERS_PER_PAGE, USERS_PER_PAGE):
         col1, col2, col3 = st.columns(3)
         col1.write(username)
-        col2.write(details["role"])
+        col2.write(role)
         if col3.button(f"Delete {username}"):
-            del users[username]
-            save_users(users)
-            st.experimental_rerun()
+            store.delete(username)
+            st.rerun()
 
     st.subheader("Add New User")
     new_username = st.text_input("New Username")
     new_password = st.text_input("New Password", type="password")
     new_role = st.selectbox("Role", ["admin", "user"])
     if st.button("Add User"):
-        if new_username in users:
-            st.error("Username already exists")
-        else:
-            users[new_username] = {
-                "password": hash_password(new_password),
-                "role": new_role
-            }
-            save_users(users)
+        if store.add(new_username, hash_password(new_password), new_role):
             st.success("User added successfully")
+        else:
+            st.error("Username already exists")
@@ -1,31 +1,196 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
+
 import streamlit as st
 import pandas as pd
 from auth import login_page, initialize_user_db
+from compact_schema import COMPACT_SCHEMA, compact_chunks
 from Metric_calculation import user_dashboard, admin_dashboard
-import chardet
+from dataset import append_days, build_dataset
+from dataset_registry import enable_copy_on_write, get_registry, load_stored_version, session_dataset, session_id
+from dataset_store import (
+    get_active_version, list_versions, prune_ancestors, save_dataset, save_disk_dataset, set_active_version,
+)
+from history_store import HISTORY_BACKEND
+from perf import begin_run, finish_run, stage, tag_run
+from result_cache import get_result_cache
+from ingest import (
+    DEVICE_COLUMNS, DISCONNECTED_COLUMNS, MASTER_COLUMNS, STREAMING_THRESHOLD_BYTES, SUPPORTED_EXTENSIONS,
+    dataset_fingerprint, derived_version, file_size, iter_disconnected_file, join_clusters, normalize_device_df,
+    normalize_disconnected_df, normalize_master_df, read_disconnected_csv, read_table,
+)
 
-def safe_read_file(uploaded_file):
-    import io
-    import chardet
+enable_copy_on_write()
 
+def safe_read_file(uploaded_file):
     file_name = uploaded_file.name.lower()
+    if not file_name.endswith(SUPPORTED_EXTENSIONS):
+        st.error(f"Unsupported file format: {file_name}. Upload .csv, .xls, or .xlsx only.")
+        return None
     try:
-        raw_data = uploaded_file.read()
-        result = chardet.detect(raw_data)
-        encoding = result['encoding'] or 'utf-8'
-        uploaded_file.seek(0)
-
-        if file_name.endswith('.csv'):
-            return pd.read_csv(uploaded_file, encoding=encoding)
-        elif file_name.endswith(('.xls', '.xlsx')):
-            return pd.read_excel(uploaded_file)
-        else:
-            st.error(f"Unsupported file format: {file_name}. Upload .csv, .xls, or .xlsx only.")
-            return None
+        return read_table(uploaded_file)
     except Exception as e:
         st.error(f"Failed to read {file_name}: {e}")
         return None
 
+def load_dataset(version, master_file, device_file, disconnected_file):
+    # Datasets are shared by content hash, so re-uploading the same files skips parsing
+    # Registering binds this session to the version at once, so it is not
+    # evicted while it is being saved
+    dataset = get_registry().get(version)
+    if dataset is not None:
+        return get_registry().register(dataset, session_id())
+    if HISTORY_BACKEND == "parquet":
+        dataset = load_disk_dataset(version, master_file, device_file, disconnected_file)
+        return get_registry().register(dataset, session_id())
+
+    streamed = is_streamed(disconnected_file)
+    if streamed:
+        # Clusters are joined once the master file is parsed; chunks are made
+        # categorical as they arrive so the export's text is never held whole
+        read_disconnected = partial(
+            read_disconnected_csv, disconnected_file, None, combine=compact_chunks if COMPACT_SCHEMA else None
+        )
+    else:
+        read_disconnected = partial(read_table, disconnected_file, DISCONNECTED_COLUMNS)
+    with stage("parse_files"):
+        master_df, device_df, disconnected_df = parse_uploads([
+            (master_file, partial(read_table, master_file, MASTER_COLUMNS)),
+            (device_file, partial(read_table, device_file, DEVICE_COLUMNS)),
+            (disconnected_file, read_disconnected),
+        ])
+
+    with st.spinner("Preparing dataset..."), stage("prepare_dataset"):
+        if streamed:
+            master_df = normalize_master_df(master_df)
+            device_df = normalize_device_df(device_df)
+            disconnected_df = join_clusters(disconnected_df, master_df)
+            dataset = build_dataset(version, master_df, device_df, disconnected_df, normalized=True)
+        else:
+            dataset = build_dataset(version, master_df, device_df, disconnected_df)
+    return get_registry().register(dataset, session_id())
+
+def load_disk_dataset(version, master_file, device_file, disconnected_file):
+    # The history goes from the upload into Parquet files in the store
+    # without ever being held in memory as a whole
+    stored = load_stored_version(version)
+    if stored is not None:
+        return stored
+    check_extension(disconnected_file)
+
+    with stage("parse_files"):
+        master_df, device_df = parse_uploads([
+            (master_file, partial(read_table, master_file, MASTER_COLUMNS)),
+            (device_file, partial(read_table, device_file, DEVICE_COLUMNS)),
+        ])
+    master_df = normalize_master_df(master_df)
+    device_df = normalize_device_df(device_df)
+
+    name = disconnected_file.name
+    bar = st.progress(0.0, text=f"Writing {name} to disk...")
+    # Chunks are written from this thread, so a Cancel rerun stops at the
+    # next progress update and the staged version is removed
+    cancel_slot = st.empty()
+    cancel_slot.button("Cancel", key="cancel_history_write")
+    try:
+        with stage("write_history"):
+            chunks = iter_disconnected_file(
+                disconnected_file, master_df,
+                progress=lambda fraction: bar.progress(fraction, text=f"Writing {name} to disk... {fraction:.0%}"),
+            )
+            return save_disk_dataset(
+                version, master_df, device_df, chunks, source_files=[master_file.name, device_file.name, name]
+            )
+    finally:
+        bar.empty()
+        cancel_slot.empty()
+
+def check_extension(uploaded_file):
+    if not uploaded_file.name.lower().endswith(SUPPORTED_EXTENSIONS):
+        raise ValueError(f"Unsupported file format: {uploaded_file.name.lower()}. Upload .csv, .xls, or .xlsx only.")
+
+def parse_uploads(readers):
+    """Parse uploads in parallel threads, one progress bar per file.
+
+    ``readers`` pairs each uploaded file with a function reading it.
+    Clicking Cancel reruns the script, which interrupts the wait below; the
+    readers then stop at their next read.
+    """
+    for uploaded_file, _ in readers:
+        check_extension(uploaded_file)
+
+    fractions = [0.0] * len(readers)
+    bars = [st.progress(0.0, text=f"Reading {uploaded_file.name}...") for uploaded_file, _ in readers]
+    cancel_slot = st.empty()
+    cancel_slot.button("Cancel", key="cancel_upload")
+    cancel = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=len(readers))
+    try:
+        futures = [
+            pool.submit(read, progress=partial(fractions.__setitem__, i), cancelled=cancel.is_set)
+            for i, (_, read) in enumerate(readers)
+        ]
+        pending = set(futures)
+        while pending:
+            _, pending = wait(pending, timeout=0.25)
+            for bar, fraction, (uploaded_file, _) in zip(bars, fractions, readers):
+                bar.progress(fraction, text=f"Reading {uploaded_file.name}... {fraction:.0%}")
+
+        frames, errors = [], []
+        for future, (uploaded_file, _) in zip(futures, readers):
+            try:
+                frames.append(future.result())
+            except Exception as e:
+                errors.append(f"Failed to read {uploaded_file.name.lower()}: {e}")
+    finally:
+        cancel.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+        for bar in bars:
+            bar.empty()
+        cancel_slot.empty()
+
+    if errors:
+        raise ValueError("\n\n".join(errors))
+    return frames
+
+def use_dataset(version):
+    # Sessions only keep the version id; the frames live in the shared registry
+    previous_version = st.session_state.get("dataset_version")
+    if previous_version is not None and previous_version != version:
+        # Results of the replaced upload are not reused
+        get_result_cache().invalidate([previous_version])
+    st.session_state.dataset_version = version
+    st.session_state.files_uploaded = True
+    get_registry().acquire(session_id(), version)
+
+def load_active_dataset():
+    # Warm start from the dataset store so nobody has to re-upload after a restart
+    active_version = get_active_version()
+    if active_version is None:
+        return
+    st.session_state.dataset_version = active_version
+    with st.spinner("Loading stored dataset..."):
+        dataset = session_dataset()
+    if dataset is None:
+        st.session_state.dataset_version = None
+        st.warning(f"Could not load stored dataset {active_version}.")
+    else:
+        st.session_state.files_uploaded = True
+
+def persist_dataset(dataset, uploaded_files, parent_version=None):
+    try:
+        save_dataset(dataset, source_files=[f.name for f in uploaded_files], parent_version=parent_version)
+        set_active_version(dataset.version)
+        if parent_version is not None:
+            prune_ancestors(dataset.version)
+    except Exception as e:
+        st.warning(f"Dataset loaded but could not be saved for later sessions: {e}")
+
+def is_streamed(uploaded_file):
+    # Large CSV exports are parsed in chunks to bound peak memory
+    return uploaded_file.name.lower().endswith('.csv') and file_size(uploaded_file) >= STREAMING_THRESHOLD_BYTES
+
 def main():
     if "authenticated" not in st.session_state:
         initialize_user_db()
@@ -33,13 +198,15 @@ def main():
         st.session_state.username = ""
         st.session_state.role = ""
         st.session_state.files_uploaded = False
-        st.session_state.master_df = None
-        st.session_state.device_df = None
-        st.session_state.disconnected_df = None
+        st.session_state.dataset_version = None
 
     st.set_page_config(page_title="Farm Dashboard", layout="wide")
 
     if st.session_state.authenticated:
+        # The stored dataset is only loaded once someone has logged in
+        if st.session_state.dataset_version is None:
+            load_active_dataset()
+
         if not st.session_state.files_uploaded:
             file_upload_page()
         else:
@@ -78,18 +245,93 @@ def file_upload_page():
             st.warning("Please upload all required files.")
             return
 
-        master_df = safe_read_file(master_file)
-        device_df = safe_read_file(device_file)
-        disconnected_df = safe_read_file(disconnected_file)
+        begin_run("Upload Files")
+        version = dataset_fingerprint(master_file, device_file, disconnected_file)
+        try:
+            dataset = load_dataset(version, master_file, device_file, disconnected_file)
+        except ValueError as e:
+            # Failed uploads are recorded too, tagged with the error
+            tag_run(error=e)
+            st.error(str(e))
+            return
+        finally:
+            finish_run()
+
+        persist_dataset(dataset, [master_file, device_file, disconnected_file])
+        use_dataset(dataset.version)
+        st.success("Files successfully loaded. Please proceed.")
 
-        if master_df is not None and device_df is not None and disconnected_df is not None:
-            st.session_state.master_df = master_df
-            st.session_state.device_df = device_df
-            st.session_state.disconnected_df = disconnected_df
-            st.session_state.files_uploaded = True
-            st.success("Files successfully loaded. Please proceed.")
-        else:
-            st.error("Failed to load one or more files. Please check format and try again.")
+    if st.session_state.dataset_version is not None:
+        append_day_section()
+    stored_dataset_picker()
+
+def append_day_section():
+    st.subheader("➕ Append Day")
+    st.markdown("Add a new day's disconnected device file to the current dataset without re-uploading the history.")
+    day_file = st.file_uploader("Upload Daily Disconnected Device File", type=["csv", "xls", "xlsx"], key="append_day_file")
+
+    if st.button("Append Day"):
+        if not day_file:
+            st.warning("Please upload the daily file.")
+            return
+        dataset = session_dataset()
+        if dataset is None:
+            st.error("The current dataset is no longer available. Please upload the files again.")
+            return
+
+        day_df = safe_read_file(day_file)
+        if day_df is None:
+            return
+        try:
+            new_rows = normalize_disconnected_df(day_df, dataset.master_df)
+        except ValueError as e:
+            st.error(str(e))
+            return
+
+        version = derived_version(dataset.version, day_file)
+        try:
+            appended, row_count = append_days(dataset, new_rows, version)
+        except ValueError as e:
+            st.error(str(e))
+            return
+        if row_count == 0:
+            st.info("No new rows found; every device and date in this file is already loaded.")
+            return
+
+        appended = get_registry().register(appended, session_id())
+        persist_dataset(appended, [day_file], parent_version=dataset.version)
+        use_dataset(appended.version)
+        st.success(f"Appended {row_count:,} rows. Dataset {appended.version} is now active.")
+
+def stored_dataset_picker():
+    versions = list_versions()
+    if not versions:
+        return
+
+    st.subheader("🗄️ Stored Datasets")
+    active_version = get_active_version()
+    labels = {
+        manifest["version"]: (
+            f"{manifest['created_at']} · {manifest['version']} · "
+            f"{manifest['rows']['disconnected_df']:,} rows"
+            + (" (active)" if manifest["version"] == active_version else "")
+        )
+        for manifest in versions
+    }
+    selected_version = st.selectbox(
+        "Dataset Version", list(labels), format_func=labels.get, key="dataset_version_select"
+    )
+    if st.button("Use Selected Dataset"):
+        try:
+            set_active_version(selected_version)
+        except ValueError as e:
+            st.error(str(e))
+            return
+        use_dataset(selected_version)
+        if session_dataset() is None:
+            st.error(f"Failed to load dataset {selected_version}.")
+            return
+        st.success(f"Dataset {selected_version} is now active.")
 
 
 def load_data():
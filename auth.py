@@ -1,33 +1,22 @@
 import streamlit as st
-import json
 import hashlib
-import os
 from streamlit_option_menu import option_menu
+from user_store import open_user_store
 
-USER_DB_FILE = "user_db.json"
 DEFAULT_ADMIN = {"username": "admin", "password": "admin123", "role": "admin"}
 
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
-def load_users():
-    if os.path.exists(USER_DB_FILE):
-        with open(USER_DB_FILE, "r") as file:
-            return json.load(file)
-    return {}
-
-def save_users(users):
-    with open(USER_DB_FILE, "w") as file:
-        json.dump(users, file)
+@st.cache_resource
+def get_user_store():
+    # One store per process; it caches lookups and serializes writes
+    return open_user_store()
 
 def initialize_user_db():
-    users = load_users()
-    if DEFAULT_ADMIN["username"] not in users:
-        users[DEFAULT_ADMIN["username"]] = {
-            "password": hash_password(DEFAULT_ADMIN["password"]),
-            "role": DEFAULT_ADMIN["role"]
-        }
-        save_users(users)
+    store = get_user_store()
+    if store.get(DEFAULT_ADMIN["username"]) is None:
+        store.add(DEFAULT_ADMIN["username"], hash_password(DEFAULT_ADMIN["password"]), DEFAULT_ADMIN["role"])
 
 def login_page():
     st.title("Farm Dashboard Login")
@@ -50,12 +39,12 @@ def login_page():
             authenticate_user(username, password, "user")
 
 def authenticate_user(username, password, expected_role):
-    users = load_users()
-    if username in users and users[username]["password"] == hash_password(password) and users[username]["role"] == expected_role:
+    user = get_user_store().get(username)
+    if user is not None and user["password"] == hash_password(password) and user["role"] == expected_role:
         st.success("Login successful")
         st.session_state.authenticated = True
         st.session_state.username = username
-        st.session_state.role = users[username]["role"]
+        st.session_state.role = user["role"]
         st.rerun()
     else:
         st.error(f"Invalid credentials or not an {expected_role} account")
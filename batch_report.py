@@ -0,0 +1,135 @@
+"""Compute the dashboard metrics for every day, cluster and farm without Streamlit.
+
+Usage (from the repository root):
+
+    python batch_report.py master.xlsx devices.xlsx disconnected.csv --output report.parquet
+    python batch_report.py master.xlsx devices.xlsx disconnected.csv --output last_week.csv --days 7
+
+The three files are read and normalized once; the days are then split into
+contiguous ranges computed by a pool of worker processes. The report is
+written as Parquet when the output ends in .parquet and as CSV otherwise.
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from compact_schema import COMPACT_SCHEMA, compact_chunks
+from dataset import build_dataset
+from ingest import (
+    DEVICE_COLUMNS, DISCONNECTED_COLUMNS, MASTER_COLUMNS, STREAMING_THRESHOLD_BYTES, dataset_fingerprint,
+    file_size, normalize_device_df, normalize_master_df, read_disconnected_csv, read_table,
+)
+from metrics_grid import GRID_SCOPES, metrics_grid
+
+# Set once per worker process by the pool initializer
+_worker_dataset = None
+
+
+def load_files(master_path, device_path, disconnected_path):
+    """Read the three exports into a Dataset, like an upload in the app."""
+    with open(master_path, "rb") as master_file, open(device_path, "rb") as device_file, \
+            open(disconnected_path, "rb") as disconnected_file:
+        version = dataset_fingerprint(master_file, device_file, disconnected_file)
+        master_df = normalize_master_df(read_table(master_file, MASTER_COLUMNS))
+        device_df = normalize_device_df(read_table(device_file, DEVICE_COLUMNS))
+        if disconnected_path.lower().endswith(".csv") and file_size(disconnected_file) >= STREAMING_THRESHOLD_BYTES:
+            combine = compact_chunks if COMPACT_SCHEMA else None
+            disconnected_df = read_disconnected_csv(disconnected_file, master_df, combine=combine)
+            return build_dataset(version, master_df, device_df, disconnected_df, normalized=True)
+        return build_dataset(version, master_df, device_df, read_table(disconnected_file, DISCONNECTED_COLUMNS))
+
+
+def report_days(dataset, start=None, end=None, last=None):
+    """Days of the history to report on.
+
+    ``last`` keeps the calendar days within that many days of the newest
+    day in the history, the newest one included.
+    """
+    days = dataset.date_index.days
+    if last is not None and len(days):
+        days = days[days > days.max() - pd.Timedelta(days=last)]
+    if start is not None:
+        days = days[days >= start]
+    if end is not None:
+        days = days[days <= end]
+    return days
+
+
+def _init_worker(dataset):
+    # With the fork start method the dataset is inherited, not pickled
+    global _worker_dataset
+    _worker_dataset = dataset
+
+
+def _report_chunk(days, scopes):
+    return pd.concat([metrics_grid(_worker_dataset, days, by) for by in scopes], ignore_index=True)
+
+
+def build_report(dataset, days, scopes=GRID_SCOPES, workers=None):
+    """Metrics grid for the given days at each scope, one row per selection."""
+    workers = min(workers or os.cpu_count() or 1, len(days)) or 1
+    chunks = [chunk for chunk in np.array_split(np.asarray(days), workers) if len(chunk)]
+    if workers == 1:
+        _init_worker(dataset)
+        parts = [_report_chunk(chunk, scopes) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(dataset,)) as pool:
+            parts = list(pool.map(_report_chunk, chunks, [scopes] * len(chunks)))
+
+    if not parts:
+        return metrics_grid(dataset, [])
+    report = pd.concat(parts, ignore_index=True)
+    report["entry_date"] = report["entry_date"].dt.date
+    return report.sort_values(["entry_date", "Cluster", "farm_name"], kind="stable").reset_index(drop=True)
+
+
+def write_report(report, output):
+    if output.lower().endswith(".parquet"):
+        report.to_parquet(output, index=False)
+    else:
+        report.to_csv(output, index=False)
+
+
+def parse_day(value):
+    return pd.to_datetime(value, format="%d-%m-%Y")
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive number of days, got {value}")
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("master", help="Master file (.csv, .xls or .xlsx)")
+    parser.add_argument("devices", help="Device inventory file")
+    parser.add_argument("disconnected", help="Disconnected device history")
+    parser.add_argument("--output", required=True, help="Report path (.parquet or .csv)")
+    parser.add_argument("--start", type=parse_day, help="First day, DD-MM-YYYY")
+    parser.add_argument("--end", type=parse_day, help="Last day, DD-MM-YYYY")
+    parser.add_argument("--days", type=positive_int, help="Last N days, counted back from the newest day")
+    parser.add_argument("--scopes", nargs="+", choices=GRID_SCOPES, default=list(GRID_SCOPES))
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+    if args.days is not None and (args.start is not None or args.end is not None):
+        parser.error("--days cannot be combined with --start or --end")
+
+    try:
+        dataset = load_files(args.master, args.devices, args.disconnected)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Failed to load files: {e}")
+
+    days = report_days(dataset, args.start, args.end, args.days)
+    report = build_report(dataset, days, args.scopes, args.workers)
+    write_report(report, args.output)
+    print(f"Wrote {len(report)} rows for {len(days)} days to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Time the ingest, metrics and trend pipeline on synthetic data.
+
+Usage (from the repository root):
+
+    python -m benchmarks.run_benchmarks --scales small medium --output results.jsonl
+
+Each result is one JSON line with wall times and the peak traced memory, so
+runs from different versions can be compared line by line.
+"""
+import argparse
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+from app import safe_read_file
+from benchmarks.synthetic_data import generate_datasets
+from dataset import build_dataset
+from Metric_calculation import calculate_metrics, get_trend_data, preprocess_disconnected_df
+
+SCALES = {
+    "small": dict(farms=20, clusters=4, gateways_per_farm=5, devices_per_gateway=8, days=30),
+    "medium": dict(farms=200, clusters=10, gateways_per_farm=5, devices_per_gateway=8, days=90),
+    "large": dict(farms=500, clusters=20, gateways_per_farm=5, devices_per_gateway=8, days=365),
+}
+
+
+class NamedBytesIO(io.BytesIO):
+    # Stands in for a Streamlit UploadedFile
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+
+def measure(func, repeat):
+    """Wall times of ``repeat`` untraced runs and the peak of one traced run."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return timings, peak
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def scale_benchmarks(master_df, device_df, disconnected_df):
+    """Named callables exercising each pipeline stage the way the dashboard does."""
+    csv_bytes = disconnected_df.to_csv(index=False).encode()
+    dataset = build_dataset("benchmark", master_df, device_df, disconnected_df)
+    selected_date = dataset.date_index.days.max().strftime("%d-%m-%Y")
+    selected_cluster = dataset.master_df["Cluster"].iloc[0]
+    allowed_farms = dataset.master_df["farm_name"].unique()
+
+    return {
+        "safe_read_file": lambda: safe_read_file(NamedBytesIO(csv_bytes, "disconnected_output.csv")),
+        "preprocess_disconnected_df": lambda: preprocess_disconnected_df(disconnected_df, master_df),
+        "build_dataset": lambda: build_dataset("benchmark", master_df, device_df, disconnected_df),
+        "calculate_metrics": lambda: calculate_metrics(
+            dataset.master_df, dataset.device_df, dataset.disconnected_df, "All", "All", selected_date,
+            cube=dataset.cube, allowed_farms=allowed_farms, date_index=dataset.date_index,
+        ),
+        "calculate_metrics_full_scan": lambda: calculate_metrics(
+            dataset.master_df, dataset.device_df, dataset.disconnected_df, "All", "All", selected_date,
+        ),
+        "get_trend_data": lambda: get_trend_data(
+            dataset.disconnected_df, dataset.device_df, dataset.master_df, selected_cluster, "All", "All", 365,
+            cube=dataset.cube, allowed_farms=allowed_farms, date_index=dataset.date_index,
+        ),
+        "get_trend_data_full_scan": lambda: get_trend_data(
+            dataset.disconnected_df, dataset.device_df, dataset.master_df, selected_cluster, "All", "All", 365,
+        ),
+    }
+
+
+def run(scales, repeat, only=None, out=sys.stdout):
+    context = {
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    for scale in scales:
+        params = SCALES[scale]
+        master_df, device_df, disconnected_df = generate_datasets(**params)
+        for name, func in scale_benchmarks(master_df, device_df, disconnected_df).items():
+            if only and name not in only:
+                continue
+            timings, peak = measure(func, repeat)
+            result = dict(
+                context,
+                benchmark=name,
+                scale=scale,
+                params=params,
+                rows=len(disconnected_df),
+                repeat=repeat,
+                wall_seconds_min=min(timings),
+                wall_seconds_median=statistics.median(timings),
+                peak_memory_bytes=peak,
+            )
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=["small", "medium"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", help="Run only these benchmarks")
+    parser.add_argument("--output", help="Write JSON lines here instead of stdout")
+    args = parser.parse_args()
+
+    if args.output:
+        with open(args.output, "w") as out:
+            run(args.scales, args.repeat, args.only, out)
+    else:
+        run(args.scales, args.repeat, args.only)
+
+
+if __name__ == "__main__":
+    main()
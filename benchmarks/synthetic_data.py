@@ -0,0 +1,105 @@
+"""Synthetic master, device inventory and disconnected-output files.
+
+Usage (from the repository root):
+
+    python -m benchmarks.synthetic_data --farms 50 --days 90 --out-dir synthetic
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+DEVICE_TYPES = np.array(["A Type", "B Type", "C Type"])
+FARM_STATUSES = np.array(["Active", "Inactive"])
+
+
+def generate_datasets(
+    farms=20, clusters=4, gateways_per_farm=5, devices_per_gateway=8, days=30,
+    disconnection_rate=0.1, gateway_outage_rate=0.02, end_date="2024-12-31", seed=0,
+):
+    """Return (master_df, device_df, disconnected_df) in the upload file schema.
+
+    Every device reports once a day. A device is disconnected with
+    ``disconnection_rate``; on top of that a whole gateway goes down with
+    ``gateway_outage_rate`` so that gateway issues show up.
+    """
+    rng = np.random.default_rng(seed)
+
+    farm_ids = np.arange(farms)
+    master_df = pd.DataFrame({
+        "farm_name": [f"Farm {i:05d}" for i in farm_ids],
+        "Cluster": [f"Cluster {i % clusters:03d}" for i in farm_ids],
+        "farm_status": FARM_STATUSES[(farm_ids % 5 == 4).astype(int)],
+        "vcm_name": [f"VCM {i % max(clusters * 3, 1):03d}" for i in farm_ids],
+    })
+
+    gateway_farm = np.repeat(farm_ids, gateways_per_farm)
+    gateway_ids = np.arange(len(gateway_farm))
+    device_gateway = np.repeat(gateway_ids, devices_per_gateway)
+    device_ids = np.arange(len(device_gateway))
+    device_df = pd.DataFrame({
+        "farm_name": master_df["farm_name"].to_numpy()[gateway_farm[device_gateway]],
+        "gatewayid": [f"GW{g:07d}" for g in device_gateway],
+        "deviceid": [f"DEV{d:08d}" for d in device_ids],
+        "tag_number": [f"TAG{d:08d}" for d in device_ids],
+        "Device_type": DEVICE_TYPES[rng.integers(0, len(DEVICE_TYPES), len(device_ids))],
+    })
+
+    dates = pd.date_range(end=end_date, periods=days)
+    device_count = len(device_df)
+    day_of_row = np.repeat(np.arange(days), device_count)
+    device_of_row = np.tile(device_ids, days)
+
+    gateway_down = rng.random((days, len(gateway_ids))) < gateway_outage_rate
+    disconnected = (
+        (rng.random(len(day_of_row)) < disconnection_rate) |
+        gateway_down[day_of_row, device_gateway[device_of_row]]
+    )
+
+    disconnected_df = pd.DataFrame({
+        "farm_name": device_df["farm_name"].to_numpy()[device_of_row],
+        "deviceid": device_df["deviceid"].to_numpy()[device_of_row],
+        "tag_number": device_df["tag_number"].to_numpy()[device_of_row],
+        "gatewayid": device_df["gatewayid"].to_numpy()[device_of_row],
+        "Device_type": device_df["Device_type"].to_numpy()[device_of_row],
+        "data_quality": np.where(disconnected, "Disconnected", "Connected"),
+        "entry_date": dates.strftime("%d-%m-%Y").to_numpy()[day_of_row],
+    })
+    return master_df, device_df, disconnected_df
+
+
+def write_datasets(out_dir, master_df, device_df, disconnected_df):
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {}
+    for name, df in (("master", master_df), ("device_inventory", device_df), ("disconnected_output", disconnected_df)):
+        paths[name] = os.path.join(out_dir, f"{name}.csv")
+        df.to_csv(paths[name], index=False)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--farms", type=int, default=20)
+    parser.add_argument("--clusters", type=int, default=4)
+    parser.add_argument("--gateways-per-farm", type=int, default=5)
+    parser.add_argument("--devices-per-gateway", type=int, default=8)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--disconnection-rate", type=float, default=0.1)
+    parser.add_argument("--gateway-outage-rate", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out-dir", default="synthetic_data")
+    args = parser.parse_args()
+
+    frames = generate_datasets(
+        farms=args.farms, clusters=args.clusters, gateways_per_farm=args.gateways_per_farm,
+        devices_per_gateway=args.devices_per_gateway, days=args.days,
+        disconnection_rate=args.disconnection_rate, gateway_outage_rate=args.gateway_outage_rate,
+        seed=args.seed,
+    )
+    for name, path in write_datasets(args.out_dir, *frames).items():
+        print(f"{name}: {path}")
+
+
+if __name__ == "__main__":
+    main()
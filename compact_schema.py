@@ -0,0 +1,115 @@
+import os
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from ingest import as_text
+
+# Compact mode is on unless FARM_COMPACT_SCHEMA=0
+COMPACT_SCHEMA = os.environ.get("FARM_COMPACT_SCHEMA", "1") != "0"
+
+# Columns stored as categoricals whose dictionary is shared by every frame
+# holding them, so that codes mean the same value across frames. Id columns
+# become integer codes into the shared id dictionary.
+SHARED_COLUMNS = ("farm_name", "Cluster", "deviceid", "gatewayid", "tag_number")
+LABEL_COLUMNS = ("Device_type", "data_quality", "farm_status")
+
+
+def _shared_categories(frames, column):
+    values = [df[column].dropna().unique() for df in frames if column in df.columns]
+    if not values:
+        return None
+    return pd.Index(pd.concat([pd.Series(v, dtype=object) for v in values]).unique()).sort_values()
+
+
+def compact_frames(master_df, device_df, disconnected_df):
+    """Return categorical copies of the three frames."""
+    frames = [master_df.copy(), device_df.copy(), disconnected_df.copy()]
+    for column in SHARED_COLUMNS:
+        # Pooled values are sorted, so they must share one type; numbers
+        # mixed with text across files are compared as text
+        for df in frames:
+            if column in df.columns and not pd.api.types.is_string_dtype(df[column]):
+                df[column] = as_text(df[column])
+        categories = _shared_categories(frames, column)
+        if categories is None:
+            continue
+        dtype = pd.CategoricalDtype(categories)
+        for df in frames:
+            if column in df.columns:
+                df[column] = df[column].astype(dtype)
+    for df in frames:
+        for column in LABEL_COLUMNS:
+            if column in df.columns:
+                df[column] = df[column].astype("category")
+    return tuple(frames)
+
+
+def compact_chunks(chunks):
+    """Concatenate normalized history chunks as categoricals.
+
+    Each chunk's label and shared columns are made categorical as it
+    arrives, so besides the compact rows only the text of the chunk being
+    read is held. Chunk dictionaries are unioned at the end; compact_frames
+    then recodes them to the dictionaries shared with the other frames.
+    """
+    parts = []
+    for chunk in chunks:
+        for column in SHARED_COLUMNS + LABEL_COLUMNS:
+            if column in chunk.columns:
+                chunk[column] = chunk[column].astype("category")
+        parts.append(chunk)
+    if len(parts) < 2:
+        return parts[0].reset_index(drop=True) if parts else pd.DataFrame()
+
+    combined = {}
+    for column in parts[0].columns:
+        values = [part[column] for part in parts]
+        if isinstance(values[0].dtype, pd.CategoricalDtype):
+            combined[column] = union_categoricals(values, sort_categories=True)
+        else:
+            combined[column] = pd.concat(values, ignore_index=True)
+        # Each column's chunks are released as soon as it is combined
+        for part in parts:
+            del part[column]
+    return pd.DataFrame(combined)
+
+
+def extend_categories(history, new_rows):
+    """Cast new rows to the history's categorical dtypes.
+
+    Values the history has not seen are added after its categories, so the
+    returned dtypes keep every existing code valid.
+    """
+    new_rows = new_rows.copy()
+    for column in history.columns:
+        dtype = history[column].dtype
+        if not isinstance(dtype, pd.CategoricalDtype):
+            continue
+        extra = pd.Index(new_rows[column].dropna().unique()).difference(dtype.categories)
+        if len(extra):
+            dtype = pd.CategoricalDtype(dtype.categories.append(extra))
+        new_rows[column] = new_rows[column].astype(dtype)
+    return new_rows
+
+
+def memory_report(before, after):
+    """Per-column bytes before and after compaction.
+
+    ``before`` and ``after`` map a frame name to its frame.
+    """
+    rows = []
+    for name, df in before.items():
+        before_bytes = df.memory_usage(index=False, deep=True)
+        after_bytes = after[name].memory_usage(index=False, deep=True)
+        for column in df.columns:
+            rows.append({
+                "Frame": name,
+                "Column": column,
+                "Type": str(after[name][column].dtype),
+                "Bytes Before": int(before_bytes[column]),
+                "Bytes After": int(after_bytes[column]),
+            })
+    report = pd.DataFrame(rows)
+    report["Saved %"] = (1 - report["Bytes After"] / report["Bytes Before"].clip(lower=1)) * 100
+    return report
@@ -0,0 +1,196 @@
+from collections import namedtuple
+from datetime import timedelta
+
+import pandas as pd
+
+from compact_schema import COMPACT_SCHEMA, compact_frames, extend_categories, memory_report
+from date_index import DateIndex, SegmentedHistory, sort_by_entry_date
+from gateway_outage import gateway_outages
+from gateway_topology import GatewayTopology
+from history_store import ParquetHistory
+from ingest import normalize_dataset
+from metrics_cube import MetricsCube, build_metrics_cube
+
+# Rows of the disconnected history are unique on these columns
+APPEND_KEY = ["deviceid", "entry_date"]
+
+# What an append added on top of its parent version: the new rows and the
+# cube of the days they touch
+Delta = namedtuple("Delta", ["parent_version", "rows", "cube"])
+
+
+class Dataset:
+    """One normalized upload: master, device inventory and disconnected history.
+
+    Built once per upload and treated as read-only by the dashboard; every
+    rerun only filters these frames or looks up the derived tables. The
+    history is kept sorted by entry_date so that date_index can slice it.
+
+    With a ParquetHistory as ``history`` the disconnected rows stay on disk:
+    disconnected_df is None and date_index is the history itself, so every
+    slice becomes a query that reads only the matching rows. Appended days
+    use a SegmentedHistory the same way, sharing their parent's segments.
+    """
+
+    def __init__(self, version, master_df, device_df, disconnected_df, cube=None, gateway_outages=None, topology=None, history=None):
+        self.version = version
+        self.master_df = master_df
+        self.device_df = device_df
+        if history is not None:
+            self.disconnected_df = None
+            self.date_index = history
+            self.cube = cube if cube is not None else history_cube(history)
+        else:
+            self.disconnected_df = sort_by_entry_date(disconnected_df)
+            self.date_index = DateIndex(self.disconnected_df["entry_date"])
+            self.cube = cube if cube is not None else build_metrics_cube(self.disconnected_df)
+        self._gateway_outages = gateway_outages
+        self._topology = topology
+        # Per-column bytes before and after compaction, when known
+        self.memory_report = None
+        # Set on datasets made by append_days
+        self.delta = None
+
+    @property
+    def gateway_outages(self):
+        """Disconnected devices per (gateway, day) for the farms in the master file.
+
+        Matches the unfiltered dashboard view; computed on first use.
+        """
+        if self._gateway_outages is None:
+            if self.disconnected_df is None:
+                self._gateway_outages = history_gateway_outages(self.master_df, self.device_df, self.date_index)
+            else:
+                self._gateway_outages = master_gateway_outages(self.master_df, self.device_df, self.disconnected_df)
+        return self._gateway_outages
+
+    @property
+    def on_disk(self):
+        return isinstance(self.date_index, ParquetHistory)
+
+    @property
+    def segments(self):
+        if isinstance(self.date_index, SegmentedHistory):
+            return self.date_index
+        return SegmentedHistory([(self.disconnected_df, self.date_index)])
+
+    @property
+    def topology(self):
+        """GatewayTopology of the device inventory; built on first use."""
+        if self._topology is None:
+            self._topology = GatewayTopology(self.device_df, self.master_df)
+        return self._topology
+
+
+def master_gateway_outages(master_df, device_df, disconnected_df):
+    farms = master_df["farm_name"].unique()
+    rows = disconnected_df[
+        (disconnected_df["data_quality"] == "disconnected") &
+        disconnected_df["farm_name"].isin(farms)
+    ]
+    return gateway_outages(rows, device_df[device_df["farm_name"].isin(farms)])
+
+
+def history_cube(history):
+    # Cube keys start with the day, so per-month cubes only need stacking
+    cubes = [build_metrics_cube(rows) for rows in history.iter_months()]
+    return MetricsCube(
+        pd.concat([cube.cells for cube in cubes], ignore_index=True),
+        pd.concat([cube.farm_days for cube in cubes], ignore_index=True),
+    )
+
+
+def history_gateway_outages(master_df, device_df, history):
+    farms = master_df["farm_name"].unique()
+    inventory = device_df[device_df["farm_name"].isin(farms)]
+    parts = [
+        gateway_outages(rows, inventory)
+        for rows in history.iter_months(columns=["entry_date", "deviceid"], farms=farms, disconnected_only=True)
+    ]
+    # Same (gateway, day) order as a single pass over the whole history
+    return pd.concat(parts).sort_values(["gatewayid", "entry_date"], kind="stable").reset_index(drop=True)
+
+
+def replace_days(table, day_table, days):
+    # Swap the rows of the given days for day_table, keeping the table date-sorted
+    if table.empty or table["entry_date"].max() < min(days):
+        # New days after the last one only need stacking
+        return pd.concat([table, day_table], ignore_index=True)
+    kept = table[~table["entry_date"].isin(days)]
+    merged = pd.concat([kept, day_table], ignore_index=True)
+    return merged.sort_values("entry_date", kind="stable").reset_index(drop=True)
+
+
+def build_dataset(version, master_df, device_df, disconnected_df, normalized=False, compact=COMPACT_SCHEMA):
+    if not normalized:
+        master_df, device_df, disconnected_df = normalize_dataset(master_df, device_df, disconnected_df)
+    if not compact:
+        return Dataset(version, master_df, device_df, disconnected_df)
+
+    before = {"master_df": master_df, "device_df": device_df, "disconnected_df": disconnected_df}
+    master_df, device_df, disconnected_df = compact_frames(master_df, device_df, disconnected_df)
+    dataset = Dataset(version, master_df, device_df, disconnected_df)
+    dataset.memory_report = memory_report(
+        before, {"master_df": master_df, "device_df": device_df, "disconnected_df": disconnected_df}
+    )
+    return dataset
+
+
+def append_days(dataset, new_rows, version):
+    """Append normalized disconnected rows for new days to a dataset.
+
+    Rows whose (deviceid, entry_date) is already in the history are dropped.
+    Only the days touched by the new rows are read and re-aggregated. Returns
+    the new Dataset and the number of rows appended; the dataset is unchanged
+    when nothing new was found.
+    """
+    if dataset.on_disk:
+        raise ValueError("Days cannot be appended to a history stored on disk; upload the full files instead.")
+    history = dataset.segments
+    latest = history.segments[-1][0]
+    new_rows = new_rows.reindex(columns=latest.columns)
+    new_rows = new_rows[new_rows["entry_date"].notna()].drop_duplicates(APPEND_KEY)
+    if new_rows.empty:
+        return dataset, 0
+
+    # Only rows within the new rows' date range can collide with them
+    start = new_rows["entry_date"].min().normalize()
+    end = new_rows["entry_date"].max().normalize() + timedelta(days=1) - timedelta(microseconds=1)
+    nearby = history.between(None, start, end)
+    seen = pd.MultiIndex.from_frame(nearby[APPEND_KEY])
+    new_rows = new_rows[~pd.MultiIndex.from_frame(new_rows[APPEND_KEY]).isin(seen)]
+    if new_rows.empty:
+        return dataset, 0
+
+    new_rows = sort_by_entry_date(extend_categories(latest, new_rows.reset_index(drop=True)))
+    days = new_rows["entry_date"].dt.normalize().unique()
+    day_rows = history.extend(new_rows).between(None, start, end)
+    day_rows = day_rows[day_rows["entry_date"].dt.normalize().isin(days)]
+    day_outages = None
+    if dataset._gateway_outages is not None:
+        day_outages = master_gateway_outages(dataset.master_df, dataset.device_df, day_rows)
+    return extend_dataset(dataset, version, new_rows, build_metrics_cube(day_rows), day_outages), len(new_rows)
+
+
+def extend_dataset(dataset, version, rows, day_cube, day_outages=None):
+    """Dataset with ``rows`` added as a new history segment.
+
+    ``day_cube`` (and ``day_outages``, when given) replace the aggregates of
+    the days the rows fall on; nothing else is rebuilt.
+    """
+    days = rows["entry_date"].dt.normalize().unique()
+    cube = MetricsCube(
+        replace_days(dataset.cube.cells, day_cube.cells, days),
+        replace_days(dataset.cube.farm_days, day_cube.farm_days, days),
+    )
+    outages = None
+    if dataset._gateway_outages is not None and day_outages is not None:
+        outages = replace_days(dataset._gateway_outages, day_outages, days)
+
+    extended = Dataset(
+        version, dataset.master_df, dataset.device_df, None,
+        cube=cube, gateway_outages=outages, topology=dataset._topology,
+        history=dataset.segments.extend(rows),
+    )
+    extended.delta = Delta(dataset.version, rows, day_cube)
+    return extended
@@ -0,0 +1,131 @@
+import threading
+import time
+import uuid
+
+import pandas as pd
+import streamlit as st
+
+from dataset_store import load_dataset_version
+from result_cache import get_result_cache
+
+# Sessions that have not rerun for this long no longer hold their dataset
+SESSION_TTL_SECONDS = 30 * 60
+
+
+class DatasetRegistry:
+    """Process-wide store of read-only datasets shared by all sessions.
+
+    Each dataset version is held once. Sessions bind to a version on every
+    rerun; versions no session has used within the TTL are evicted.
+    """
+
+    def __init__(self, session_ttl=SESSION_TTL_SECONDS):
+        self.session_ttl = session_ttl
+        self._lock = threading.Lock()
+        self._datasets = {}
+        self._sessions = {}
+
+    def register(self, dataset, session_id=None):
+        """Add a dataset, returning the copy already held for its version if any.
+
+        With ``session_id`` that session is bound to the version in the same
+        step, so another session's eviction cannot drop a new upload before
+        its session switches to it.
+        """
+        with self._lock:
+            if session_id is not None:
+                self._sessions[session_id] = (dataset.version, time.monotonic())
+            return self._datasets.setdefault(dataset.version, dataset)
+
+    def get(self, version):
+        with self._lock:
+            return self._datasets.get(version)
+
+    def acquire(self, session_id, version, loader=None):
+        """Bind a session to a version and return the shared dataset.
+
+        ``loader`` is called with the version when it is not held (for
+        example after eviction); returns None when it cannot be provided.
+        """
+        with self._lock:
+            self._sessions[session_id] = (version, time.monotonic())
+            dataset = self._datasets.get(version)
+        if dataset is None and loader is not None:
+            dataset = loader(version)
+            if dataset is not None:
+                dataset = self.register(dataset)
+        return dataset
+
+    def release(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def usage(self):
+        """Number of live sessions per held dataset version."""
+        with self._lock:
+            self._expire_sessions()
+            counts = {version: 0 for version in self._datasets}
+            for version, _ in self._sessions.values():
+                if version in counts:
+                    counts[version] += 1
+            return counts
+
+    def evict_unused(self, keep=()):
+        """Drop versions without live sessions, except those in ``keep``."""
+        with self._lock:
+            self._expire_sessions()
+            in_use = {version for version, _ in self._sessions.values()}
+            evicted = [
+                version for version in self._datasets
+                if version not in in_use and version not in keep
+            ]
+            for version in evicted:
+                del self._datasets[version]
+            return evicted
+
+    def _expire_sessions(self):
+        cutoff = time.monotonic() - self.session_ttl
+        for session_id, (_, last_seen) in list(self._sessions.items()):
+            if last_seen < cutoff:
+                del self._sessions[session_id]
+
+
+@st.cache_resource
+def get_registry():
+    return DatasetRegistry()
+
+
+def session_id():
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return st.session_state.session_id
+
+
+def load_stored_version(version):
+    try:
+        return load_dataset_version(version)
+    except ValueError:
+        return None
+
+
+def session_dataset():
+    """Shared dataset for this session's version, reloaded from the store if evicted."""
+    version = st.session_state.get("dataset_version")
+    if version is None:
+        return None
+    registry = get_registry()
+    dataset = registry.acquire(session_id(), version, loader=load_stored_version)
+    evicted = registry.evict_unused()
+    if evicted:
+        get_result_cache().invalidate(evicted)
+    return dataset
+
+
+def enable_copy_on_write():
+    # Filters taken by one session must never write through to the shared
+    # frames. Copy-on-Write is always on from pandas 3.0.
+    if int(pd.__version__.split(".")[0]) < 3:
+        try:
+            pd.set_option("mode.copy_on_write", True)
+        except (KeyError, AttributeError):
+            pass
@@ -0,0 +1,247 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+from pyarrow import feather
+
+from dataset import Dataset, extend_dataset
+from history_store import ParquetHistory, write_history
+from metrics_cube import MetricsCube
+
+# Arrow IPC (Feather v2) files are written uncompressed so that they can be
+# memory-mapped on load instead of parsed
+DATA_STORE_DIR = os.environ.get("FARM_DATA_STORE", "data_store")
+ACTIVE_FILE = "ACTIVE"
+MANIFEST_FILE = "manifest.json"
+FRAMES = ("master_df", "device_df", "disconnected_df")
+CUBE_FRAMES = ("cells", "farm_days")
+# Versions kept along a chain of appended days, the newest one included
+KEEP_VERSIONS = int(os.environ.get("FARM_KEEP_VERSIONS", "3"))
+# Appended days are stored as deltas on top of their parent version; after
+# this many in a row the next one is stored as a full copy again
+MAX_DELTA_CHAIN = int(os.environ.get("FARM_MAX_DELTAS", "30"))
+DELTA_FILE = "delta_df.feather"
+# Present only in versions whose history is kept on disk
+HISTORY_DIR = "history"
+OUTAGES_FILE = "gateway_outages.feather"
+
+
+def _version_dir(version, store_dir=DATA_STORE_DIR):
+    return os.path.join(store_dir, version)
+
+
+def _write_frame(df, path):
+    df.reset_index(drop=True).to_feather(path, compression="uncompressed")
+
+
+def _read_frame(path):
+    return feather.read_table(path, memory_map=True).to_pandas()
+
+
+def _manifest(dataset, source_files, parent_version, depth):
+    if dataset.disconnected_df is None:
+        rows = {name: len(getattr(dataset, name)) for name in FRAMES if name != "disconnected_df"}
+        rows["disconnected_df"] = dataset.date_index.count_rows()
+    else:
+        rows = {name: len(getattr(dataset, name)) for name in FRAMES}
+    return {
+        "version": dataset.version,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "source_files": list(source_files),
+        "parent_version": parent_version,
+        "rows": rows,
+        "history": "parquet" if dataset.on_disk else "feather",
+        # Deltas since the last full copy; 0 for a full copy
+        "depth": depth,
+    }
+
+
+def _publish(version, store_dir, write):
+    # Files are written to a staging directory, then published in one step so
+    # readers never see a partial version
+    target = _version_dir(version, store_dir)
+    if os.path.exists(target):
+        return target
+
+    os.makedirs(store_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f".{version}-", dir=store_dir)
+    try:
+        write(staging)
+        os.replace(staging, target)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return target
+
+
+def _write_dataset(dataset, staging, source_files, parent_version, depth=0):
+    if depth:
+        # Only what the append added; the rest is read from the parent
+        _write_frame(dataset.delta.rows, os.path.join(staging, DELTA_FILE))
+        for name in CUBE_FRAMES:
+            _write_frame(getattr(dataset.delta.cube, name), os.path.join(staging, f"delta_cube_{name}.feather"))
+    else:
+        for name in FRAMES:
+            frame = getattr(dataset, name)
+            if frame is None and not dataset.on_disk:
+                frame = dataset.date_index.query()
+            if frame is not None:
+                _write_frame(frame, os.path.join(staging, f"{name}.feather"))
+        for name in CUBE_FRAMES:
+            _write_frame(getattr(dataset.cube, name), os.path.join(staging, f"cube_{name}.feather"))
+    if dataset.on_disk:
+        # Recomputing outages would scan the whole history again
+        _write_frame(dataset.gateway_outages, os.path.join(staging, OUTAGES_FILE))
+    with open(os.path.join(staging, MANIFEST_FILE), "w") as file:
+        json.dump(_manifest(dataset, source_files, parent_version, depth), file)
+
+
+def save_dataset(dataset, source_files=(), parent_version=None, store_dir=DATA_STORE_DIR):
+    """Write a dataset and its aggregate cube under its version id.
+
+    A dataset appended to ``parent_version`` is stored as a delta: its new
+    rows and the cube of their days, loaded on top of the parent. Every
+    MAX_DELTA_CHAIN appends a full copy is written instead.
+    """
+    depth = 0
+    parent = _read_manifest(parent_version, store_dir) if parent_version is not None else None
+    if parent is not None and dataset.delta is not None and dataset.delta.parent_version == parent_version:
+        depth = parent.get("depth", 0) + 1
+        if depth > MAX_DELTA_CHAIN:
+            depth = 0
+    return _publish(
+        dataset.version, store_dir,
+        lambda staging: _write_dataset(dataset, staging, source_files, parent_version, depth),
+    )
+
+
+def save_disk_dataset(version, master_df, device_df, chunks, source_files=(), store_dir=DATA_STORE_DIR):
+    """Write an upload straight into the store with its history as Parquet.
+
+    ``chunks`` yields normalized disconnected rows; they go to disk as they
+    arrive and the cube and gateway outages are then built one month at a
+    time, so the history never has to fit in memory. Returns the stored
+    dataset, whose queries read the Parquet files.
+    """
+    def write(staging):
+        history_path = os.path.join(staging, HISTORY_DIR)
+        if write_history(chunks, history_path) == 0:
+            raise ValueError(
+                "All dates in 'entry_date' failed to parse. Ensure format is DD-MM-YYYY or clean invisible characters."
+            )
+        dataset = Dataset(version, master_df, device_df, None, history=ParquetHistory(history_path))
+        _write_dataset(dataset, staging, source_files, None)
+
+    _publish(version, store_dir, write)
+    return load_dataset_version(version, store_dir)
+
+
+def load_dataset_version(version, store_dir=DATA_STORE_DIR):
+    """Memory-map a stored dataset; no CSV/Excel parsing is involved."""
+    source = _version_dir(version, store_dir)
+    manifest = _read_manifest(version, store_dir)
+    if manifest is None:
+        raise ValueError(f"Dataset version {version} not found in {store_dir}.")
+
+    if manifest.get("depth"):
+        parent = load_dataset_version(manifest["parent_version"], store_dir)
+        rows = _read_frame(os.path.join(source, DELTA_FILE))
+        day_cube = MetricsCube(*(
+            _read_frame(os.path.join(source, f"delta_cube_{name}.feather")) for name in CUBE_FRAMES
+        ))
+        return extend_dataset(parent, version, rows, day_cube)
+
+    cube = MetricsCube(*(_read_frame(os.path.join(source, f"cube_{name}.feather")) for name in CUBE_FRAMES))
+    master_df = _read_frame(os.path.join(source, "master_df.feather"))
+    device_df = _read_frame(os.path.join(source, "device_df.feather"))
+    history_path = os.path.join(source, HISTORY_DIR)
+    if os.path.isdir(history_path):
+        outages = _read_frame(os.path.join(source, OUTAGES_FILE))
+        return Dataset(
+            version, master_df, device_df, None,
+            cube=cube, gateway_outages=outages, history=ParquetHistory(history_path),
+        )
+    disconnected_df = _read_frame(os.path.join(source, "disconnected_df.feather"))
+    return Dataset(version, master_df, device_df, disconnected_df, cube=cube)
+
+
+def _read_manifest(version, store_dir=DATA_STORE_DIR):
+    path = os.path.join(_version_dir(version, store_dir), MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+def _delta_bases(version, store_dir=DATA_STORE_DIR):
+    # Versions a stored delta is loaded on top of, down to its full copy
+    bases = []
+    manifest = _read_manifest(version, store_dir) if version is not None else None
+    while manifest is not None and manifest.get("depth"):
+        bases.append(manifest["parent_version"])
+        manifest = _read_manifest(manifest["parent_version"], store_dir)
+    return bases
+
+
+def prune_ancestors(version, keep=KEEP_VERSIONS, store_dir=DATA_STORE_DIR):
+    """Delete the append ancestors of a version beyond the ``keep`` newest.
+
+    Ancestors that a kept delta (or the active version) is still loaded on
+    top of stay until a full copy supersedes them. Returns the deleted
+    versions.
+    """
+    ancestors = []
+    manifest = _read_manifest(version, store_dir)
+    while manifest is not None and manifest["parent_version"] is not None:
+        ancestors.append(manifest["parent_version"])
+        manifest = _read_manifest(manifest["parent_version"], store_dir)
+
+    active_version = get_active_version(store_dir)
+    kept = [version, *ancestors[:max(keep - 1, 0)], active_version]
+    needed = {base for kept_version in kept for base in _delta_bases(kept_version, store_dir)}
+    deleted = []
+    for ancestor in ancestors[max(keep - 1, 0):]:
+        # The oldest ancestor may already be gone from an earlier prune
+        if ancestor == active_version or ancestor in needed or not os.path.isdir(_version_dir(ancestor, store_dir)):
+            continue
+        # Unpublished in one step, like save_dataset publishes
+        trash = os.path.join(store_dir, f".{ancestor}.deleted")
+        shutil.rmtree(trash, ignore_errors=True)
+        os.replace(_version_dir(ancestor, store_dir), trash)
+        shutil.rmtree(trash, ignore_errors=True)
+        deleted.append(ancestor)
+    return deleted
+
+
+def list_versions(store_dir=DATA_STORE_DIR):
+    """Manifests of the stored versions, newest first."""
+    if not os.path.isdir(store_dir):
+        return []
+    manifests = []
+    for name in os.listdir(store_dir):
+        path = os.path.join(store_dir, name, MANIFEST_FILE)
+        if os.path.exists(path):
+            with open(path) as file:
+                manifests.append(json.load(file))
+    return sorted(manifests, key=lambda manifest: manifest["created_at"], reverse=True)
+
+
+def get_active_version(store_dir=DATA_STORE_DIR):
+    path = os.path.join(store_dir, ACTIVE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        version = file.read().strip()
+    return version if os.path.isdir(_version_dir(version, store_dir)) else None
+
+
+def set_active_version(version, store_dir=DATA_STORE_DIR):
+    if not os.path.isdir(_version_dir(version, store_dir)):
+        raise ValueError(f"Dataset version {version} not found in {store_dir}.")
+    os.makedirs(store_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=store_dir)
+    with os.fdopen(fd, "w") as file:
+        file.write(version)
+    os.replace(tmp_path, os.path.join(store_dir, ACTIVE_FILE))
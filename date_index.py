@@ -0,0 +1,119 @@
+from datetime import timedelta
+
+import pandas as pd
+
+
+def sort_by_entry_date(disconnected_df):
+    """Return the history sorted by entry_date with unparsed dates last.
+
+    Already sorted frames are returned as they are.
+    """
+    entry_dates = disconnected_df["entry_date"]
+    valid = entry_dates.notna()
+    valid_count = int(valid.sum())
+    if valid[:valid_count].all() and entry_dates[:valid_count].is_monotonic_increasing:
+        return disconnected_df
+    return disconnected_df.sort_values("entry_date", kind="stable", na_position="last").reset_index(drop=True)
+
+
+class DateIndex:
+    """Binary-search index over a history sorted by entry_date.
+
+    Slices are positional (``iloc``), so they are views on the shared frame
+    rather than copies.
+    """
+
+    def __init__(self, entry_dates):
+        valid_count = int(entry_dates.notna().sum())
+        self._dates = pd.DatetimeIndex(entry_dates.to_numpy()[:valid_count])
+        self.days = self._dates.normalize().unique()
+
+    def between(self, df, start, end, farms=None, disconnected_only=False, columns=None):
+        """Rows with start <= entry_date <= end.
+
+        ``farms``, ``disconnected_only`` and ``columns`` narrow the slice the
+        way ParquetHistory narrows its scan.
+        """
+        first = self._dates.searchsorted(pd.Timestamp(start), side="left")
+        last = self._dates.searchsorted(pd.Timestamp(end), side="right")
+        return select_rows(df.iloc[first:last], farms, disconnected_only, columns)
+
+    def day(self, df, day, farms=None, disconnected_only=False, columns=None):
+        """Rows on one calendar day."""
+        day = pd.Timestamp(day).normalize()
+        first = self._dates.searchsorted(day, side="left")
+        last = self._dates.searchsorted(day + timedelta(days=1), side="left")
+        return select_rows(df.iloc[first:last], farms, disconnected_only, columns)
+
+
+def select_rows(rows, farms=None, disconnected_only=False, columns=None):
+    if farms is not None:
+        rows = rows[rows["farm_name"].isin(farms)]
+    if disconnected_only:
+        rows = rows[rows["data_quality"] == "disconnected"]
+    if columns is not None:
+        rows = rows[list(columns)]
+    return rows
+
+
+class SegmentedHistory:
+    """History held as date-sorted segments: a base and the days appended to it.
+
+    Each segment keeps its own DateIndex, so appending a day only indexes
+    that day's rows. Answers the same calls as ParquetHistory; slices from
+    several segments are combined and sorted by entry_date.
+    """
+
+    def __init__(self, segments):
+        # (frame, DateIndex) pairs, oldest first
+        self.segments = segments
+        days = segments[0][1].days.append([index.days for _, index in segments[1:]])
+        self.days = days.unique().sort_values()
+
+    def extend(self, rows):
+        return SegmentedHistory(self.segments + [(rows, DateIndex(rows["entry_date"]))])
+
+    def count_rows(self):
+        return sum(len(frame) for frame, _ in self.segments)
+
+    def _combine(self, parts):
+        parts = [part for part in parts if len(part)]
+        if not parts:
+            return self.segments[-1][0].iloc[:0]
+        if len(parts) == 1:
+            return parts[0]
+        # Later segments only add categories, so their dtypes hold every
+        # earlier value under the same codes
+        dtypes = self.segments[-1][0].dtypes
+        parts = [
+            part.astype({column: dtypes[column] for column in part.columns
+                         if isinstance(dtypes[column], pd.CategoricalDtype)})
+            for part in parts
+        ]
+        rows = pd.concat(parts, ignore_index=True)
+        if "entry_date" not in rows:
+            return rows
+        return rows.sort_values("entry_date", kind="stable").reset_index(drop=True)
+
+    def query(self, start=None, end=None, farms=None, disconnected_only=False, columns=None):
+        """Rows with start <= entry_date <= end, sorted by entry_date."""
+        start = self.days[0] if start is None else start
+        end = self.days[-1] + timedelta(days=1) - timedelta(microseconds=1) if end is None else end
+        return self._combine(
+            index.between(frame, start, end, farms, disconnected_only, columns) for frame, index in self.segments
+        )
+
+    def between(self, df, start, end, farms=None, disconnected_only=False, columns=None):
+        return self.query(start, end, farms, disconnected_only, columns)
+
+    def day(self, df, day, farms=None, disconnected_only=False, columns=None):
+        return self._combine(
+            index.day(frame, day, farms, disconnected_only, columns) for frame, index in self.segments
+        )
+
+    def iter_months(self, columns=None, farms=None, disconnected_only=False):
+        """Rows of each month in date order, one frame per month."""
+        for month in self.days.to_period("M").unique():
+            start = month.start_time
+            end = month.end_time
+            yield self.query(start, end, farms, disconnected_only, columns)
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+
+def _as_float(values):
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.astype("datetime64[ns]").astype("int64").to_numpy(dtype=float)
+    return values.to_numpy(dtype=float)
+
+
+def lttb_indices(x, y, threshold):
+    """Positions kept by Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, from each of ``threshold - 2``
+    equal buckets in between, the point forming the largest triangle with
+    the previously kept point and the mean of the next bucket. Peaks and
+    dips survive, unlike with plain averaging.
+    """
+    x = _as_float(x)
+    y = _as_float(y)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    kept = np.empty(threshold, dtype=int)
+    kept[0] = 0
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_start, next_stop = edges[bucket + 1], edges[bucket + 2]
+        else:
+            next_start, next_stop = n - 1, n
+        next_x = x[next_start:next_stop].mean()
+        next_y = y[next_start:next_stop].mean()
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:stop] - y[previous]) -
+            (x[previous] - x[start:stop]) * (next_y - y[previous])
+        )
+        previous = start + int(areas.argmax())
+        kept[bucket + 1] = previous
+    kept[-1] = n - 1
+    return kept
+
+
+def lttb(df, x, y, threshold):
+    """Rows of ``df`` (sorted by ``x``) kept by LTTB on the ``y`` column."""
+    if len(df) <= threshold:
+        return df
+    return df.iloc[lttb_indices(df[x], df[y], threshold)]
+
+
+def weekly_peaks(df, x, y):
+    """Highest ``y`` of each calendar week, labelled with the week's Monday.
+
+    Peaks do not depend on days missing from a sparse series, as means would.
+    """
+    if df.empty:
+        return df
+    peaks = df.set_index(x)[y].resample("W-MON", label="left", closed="left").max().dropna()
+    return peaks.reset_index()
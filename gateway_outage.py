@@ -0,0 +1,77 @@
+import pandas as pd
+
+
+def gateway_membership(device_df):
+    """Distinct (gatewayid, deviceid) pairs from the device inventory."""
+    return device_df[["gatewayid", "deviceid"]].dropna().drop_duplicates()
+
+
+def gateway_outages(disconnected_df, device_df):
+    """Count disconnected devices per (gateway, day) in one batched pass.
+
+    ``disconnected_df`` holds the rows already filtered to disconnected
+    devices; ``device_df`` is the inventory the gateways are taken from.
+    Returns one row per gateway and day on which at least one of its devices
+    was disconnected, with the gateway size and the share of it that was down.
+    """
+    membership = gateway_membership(device_df)
+    gateway_sizes = membership.groupby("gatewayid", observed=True).size().rename("gateway_devices")
+
+    # Match devices through integer codes so differing id dtypes never raise
+    device_index = pd.Index(membership["deviceid"].unique())
+    membership = membership.assign(device_code=device_index.get_indexer(membership["deviceid"]))
+
+    down = pd.DataFrame({
+        "entry_date": disconnected_df["entry_date"].dt.normalize(),
+        "device_code": device_index.get_indexer(disconnected_df["deviceid"]),
+    })
+    down = down[(down["device_code"] >= 0) & down["entry_date"].notna()].drop_duplicates()
+
+    hits = down.merge(membership[["gatewayid", "device_code"]], on="device_code")
+    outages = (
+        hits.groupby(["gatewayid", "entry_date"], observed=True).size()
+        .rename("disconnected_devices")
+        .reset_index()
+        .join(gateway_sizes, on="gatewayid")
+    )
+    outages["down_ratio"] = outages["disconnected_devices"] / outages["gateway_devices"]
+    return outages
+
+
+def daily_gateway_outage_counts(outages, start_date, end_date):
+    """Number of fully disconnected gateways for every day in the range."""
+    full = outages[outages["disconnected_devices"] == outages["gateway_devices"]]
+    counts = full.groupby("entry_date").size()
+    days = pd.date_range(start=start_date, end=end_date)
+    counts = counts.reindex(days, fill_value=0)
+    return pd.DataFrame({"entry_date": days, "Disconnected Gateways": counts.values})
+
+
+def fully_down_gateway_counts(disconnected_df, device_df, key):
+    """Number of fully disconnected gateways per (day, key value).
+
+    Both frames carry a ``key`` column (e.g. farm_name) and gateways are
+    checked within each key value: a gateway is down when every inventory
+    device it has under that key is among the disconnected rows under the
+    same key, as the dashboard does for a farm or cluster selection.
+    ``disconnected_df`` must hold normalized days in entry_date.
+    """
+    membership = device_df[[key, "gatewayid", "deviceid"]].dropna().drop_duplicates()
+    gateway_sizes = membership.groupby([key, "gatewayid"], observed=True).size().rename("gateway_devices")
+
+    device_index = pd.Index(membership["deviceid"].unique())
+    membership = membership.assign(device_code=device_index.get_indexer(membership["deviceid"]))
+    down = disconnected_df[["entry_date", key]].assign(
+        device_code=device_index.get_indexer(disconnected_df["deviceid"])
+    )
+    down = down[(down["device_code"] >= 0) & down["entry_date"].notna()].drop_duplicates()
+
+    hits = down.merge(membership[[key, "gatewayid", "device_code"]], on=[key, "device_code"])
+    counts = (
+        hits.groupby(["entry_date", key, "gatewayid"], observed=True).size()
+        .rename("disconnected_devices")
+        .reset_index()
+        .join(gateway_sizes, on=[key, "gatewayid"])
+    )
+    full = counts[counts["disconnected_devices"] == counts["gateway_devices"]]
+    return full.groupby(["entry_date", key], observed=True).size()
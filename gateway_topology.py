@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+
+class GatewayTopology:
+    """Gateway to device membership of an inventory as integer arrays.
+
+    Devices, gateways, farms and clusters are numbered by their position in
+    ``device_index``, ``gateway_index``, ``farm_index`` and
+    ``cluster_index``. Membership is stored per (farm, gateway) segment in
+    CSR form: the device codes of segment ``s`` are
+    ``members[offsets[s]:offsets[s + 1]]``. Segments are ordered by cluster,
+    farm and gateway, so the segments of one farm or one cluster form a
+    contiguous range. A gateway spanning farms has one segment per farm,
+    which keeps a farm selection limited to that farm's devices, as the
+    dashboard does when it filters the inventory.
+    """
+
+    def __init__(self, device_df, master_df):
+        membership = device_df[["farm_name", "gatewayid", "deviceid"]].dropna().drop_duplicates()
+        clusters = master_df.drop_duplicates("farm_name").set_index("farm_name")["Cluster"]
+
+        self.device_index = pd.Index(membership["deviceid"].unique())
+        self.gateway_index = pd.Index(membership["gatewayid"].unique()).sort_values()
+        self.farm_index = pd.Index(membership["farm_name"].unique())
+        self.cluster_index = pd.Index(clusters.dropna().unique())
+
+        farm_clusters = self.cluster_index.get_indexer(clusters.reindex(self.farm_index))
+        # Farms without a cluster sort last
+        farm_clusters = np.where(farm_clusters < 0, len(self.cluster_index), farm_clusters)
+
+        farm_codes = self.farm_index.get_indexer(membership["farm_name"])
+        gateway_codes = self.gateway_index.get_indexer(membership["gatewayid"])
+        device_codes = self.device_index.get_indexer(membership["deviceid"])
+        cluster_codes = farm_clusters[farm_codes]
+        order = np.lexsort((device_codes, gateway_codes, farm_codes, cluster_codes))
+        farm_codes, gateway_codes, cluster_codes = farm_codes[order], gateway_codes[order], cluster_codes[order]
+
+        self.members = device_codes[order].astype(np.int32)
+        starts = np.ones(len(order), dtype=bool)
+        starts[1:] = (farm_codes[1:] != farm_codes[:-1]) | (gateway_codes[1:] != gateway_codes[:-1])
+        first = np.flatnonzero(starts)
+        self.offsets = np.append(first, len(order)).astype(np.int64)
+        self.segment_gateway = gateway_codes[first].astype(np.int32)
+        self.segment_farm = farm_codes[first].astype(np.int32)
+        self.segment_cluster = cluster_codes[first].astype(np.int32)
+
+        self.farm_ranges = self._ranges(self.segment_farm, len(self.farm_index))
+        self.cluster_ranges = self._ranges(self.segment_cluster, len(self.cluster_index) + 1)
+
+    @staticmethod
+    def _ranges(codes, size):
+        # [start, stop) of each code's run in the sorted segment codes
+        ranges = np.zeros((size, 2), dtype=np.int64)
+        values, first, counts = np.unique(codes, return_index=True, return_counts=True)
+        ranges[values, 0] = first
+        ranges[values, 1] = first + counts
+        return ranges
+
+    def segments(self, farms=None, selected_cluster="All", selected_farm="All"):
+        """Positions of the segments in a dashboard selection.
+
+        The farm or cluster filter picks a contiguous range; ``farms``, when
+        given, then keeps only segments of those farms.
+        """
+        start, stop = 0, len(self.segment_farm)
+        if selected_farm != "All":
+            code = self.farm_index.get_indexer([selected_farm])[0]
+            start, stop = self.farm_ranges[code] if code >= 0 else (0, 0)
+        elif selected_cluster != "All":
+            code = self.cluster_index.get_indexer([selected_cluster])[0]
+            start, stop = self.cluster_ranges[code] if code >= 0 else (0, 0)
+
+        selected = np.arange(start, stop)
+        if farms is not None:
+            allowed = np.zeros(len(self.farm_index), dtype=bool)
+            codes = self.farm_index.get_indexer(pd.Index(farms).unique())
+            allowed[codes[codes >= 0]] = True
+            selected = selected[allowed[self.segment_farm[selected]]]
+        return selected
+
+    def device_mask(self, deviceids):
+        """Boolean array over device codes, True for the given devices."""
+        mask = np.zeros(len(self.device_index), dtype=bool)
+        codes = self.device_index.get_indexer(pd.Index(deviceids).unique())
+        mask[codes[codes >= 0]] = True
+        return mask
+
+    def gateway_status(self, disconnected_deviceids, segments=None):
+        """Size, disconnected devices and down ratio of each selected gateway.
+
+        Counts come from array operations over the membership: a reduceat
+        per segment and a bincount per gateway, with no per-gateway Python
+        work. Gateways without devices in the selection are left out.
+        """
+        if segments is None:
+            segments = np.arange(len(self.segment_farm))
+        down = self.device_mask(disconnected_deviceids)
+        segment_sizes = np.diff(self.offsets)
+        if len(self.members):
+            segment_down = np.add.reduceat(down[self.members].astype(np.int64), self.offsets[:-1])
+        else:
+            segment_down = np.zeros(0, dtype=np.int64)
+
+        gateways = self.segment_gateway[segments]
+        sizes = np.bincount(gateways, weights=segment_sizes[segments], minlength=len(self.gateway_index))
+        down_counts = np.bincount(gateways, weights=segment_down[segments], minlength=len(self.gateway_index))
+        present = np.flatnonzero(sizes > 0)
+        return pd.DataFrame({
+            "gatewayid": self.gateway_index.take(present),
+            "gateway_devices": sizes[present].astype(np.int64),
+            "disconnected_devices": down_counts[present].astype(np.int64),
+            "down_ratio": down_counts[present] / sizes[present],
+        })
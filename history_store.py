@@ -0,0 +1,147 @@
+import os
+from datetime import timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from ingest import DISCONNECTED_COLUMNS, as_text
+
+# "memory" keeps the disconnected history in a DataFrame; "parquet" keeps it
+# on local disk in the dataset store and queries it there
+HISTORY_BACKEND = os.environ.get("FARM_HISTORY_BACKEND", "memory")
+
+HISTORY_SCHEMA = pa.schema(
+    [("entry_date", pa.timestamp("us"))]
+    + [(column, pa.string()) for column in DISCONNECTED_COLUMNS if column != "entry_date"]
+    + [("Cluster", pa.string()), ("month", pa.string())]
+)
+HISTORY_COLUMNS = [name for name in HISTORY_SCHEMA.names if name != "month"]
+MONTH_PARTITIONING = ds.partitioning(pa.schema([("month", pa.string())]), flavor="hive")
+# Row groups carry min/max entry_date statistics, so a day query within a
+# month only decodes the groups that overlap it
+ROW_GROUP_ROWS = 64 * 1024
+
+
+def _month(timestamp):
+    return pd.Timestamp(timestamp).strftime("%Y-%m")
+
+
+def _history_batch(chunk):
+    # Rows without a parsed date never match a date filter, so they are not kept
+    chunk = chunk[chunk["entry_date"].notna()].reindex(columns=HISTORY_COLUMNS)
+    # Every other column is stored as text; columns missing from the export
+    # (e.g. gatewayid) become all-null, and numeric clusters become text
+    for column in HISTORY_COLUMNS:
+        if column != "entry_date":
+            chunk[column] = as_text(chunk[column])
+    chunk = chunk.assign(month=chunk["entry_date"].dt.strftime("%Y-%m"))
+    return pa.RecordBatch.from_pandas(chunk, schema=HISTORY_SCHEMA, preserve_index=False)
+
+
+def write_history(chunks, path):
+    """Write normalized disconnected chunks as Parquet, one partition per month.
+
+    Each chunk is written as it arrives, from the caller's thread, then
+    every month is rewritten as one file sorted by entry_date; at most one
+    month is held in memory. Returns the number of rows written.
+    """
+    for number, chunk in enumerate(chunks):
+        try:
+            batch = _history_batch(chunk)
+        except (pa.ArrowException, TypeError) as e:
+            raise ValueError(f"Disconnected device file could not be stored: {e}") from e
+        ds.write_dataset(
+            pa.Table.from_batches([batch]), path,
+            format="parquet", partitioning=MONTH_PARTITIONING,
+            basename_template=f"chunk-{number}-{{i}}.parquet", existing_data_behavior="overwrite_or_ignore",
+        )
+    if not os.path.isdir(path):
+        return 0
+
+    rows = 0
+    for month_dir in sorted(os.listdir(path)):
+        month_path = os.path.join(path, month_dir)
+        chunk_files = sorted(os.listdir(month_path))
+        table = ds.dataset(month_path, format="parquet").to_table().sort_by("entry_date")
+        pq.write_table(table, os.path.join(month_path, "part-0.parquet"), row_group_size=ROW_GROUP_ROWS)
+        for name in chunk_files:
+            os.remove(os.path.join(month_path, name))
+        rows += table.num_rows
+    return rows
+
+
+class ParquetHistory:
+    """Disconnected history kept on disk as month-partitioned Parquet.
+
+    Answers the same between() and day() calls as DateIndex but ignores
+    their frame argument: the date range, farm selection, disconnected
+    filter and column list are pushed into the Parquet scan, so only the
+    matching rows are read into memory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._dataset = ds.dataset(path, format="parquet", partitioning=MONTH_PARTITIONING)
+        self._days = None
+
+    @property
+    def months(self):
+        return sorted({
+            ds.get_partition_keys(fragment.partition_expression)["month"]
+            for fragment in self._dataset.get_fragments()
+        })
+
+    @property
+    def days(self):
+        """Sorted days with any rows; read one month of dates at a time."""
+        if self._days is None:
+            days = [
+                pd.DatetimeIndex(rows["entry_date"]).normalize().unique()
+                for rows in self.iter_months(columns=["entry_date"])
+            ]
+            self._days = days[0].append(days[1:]) if days else pd.DatetimeIndex([])
+        return self._days
+
+    def count_rows(self):
+        return self._dataset.count_rows()
+
+    def query(self, start=None, end=None, farms=None, disconnected_only=False, columns=None):
+        """Rows with start <= entry_date <= end, sorted by entry_date."""
+        conditions = []
+        if start is not None:
+            conditions.append(ds.field("month") >= _month(start))
+            conditions.append(ds.field("entry_date") >= pa.scalar(pd.Timestamp(start), pa.timestamp("us")))
+        if end is not None:
+            conditions.append(ds.field("month") <= _month(end))
+            conditions.append(ds.field("entry_date") <= pa.scalar(pd.Timestamp(end), pa.timestamp("us")))
+        if farms is not None:
+            farms = pa.array(pd.Series(farms).dropna().astype(str).unique(), pa.string())
+            conditions.append(ds.field("farm_name").isin(farms))
+        if disconnected_only:
+            conditions.append(ds.field("data_quality") == "disconnected")
+
+        columns = list(columns) if columns is not None else HISTORY_COLUMNS
+        condition = None
+        for part in conditions:
+            condition = part if condition is None else condition & part
+        table = self._dataset.to_table(columns=columns, filter=condition)
+        if "entry_date" in columns:
+            table = table.sort_by("entry_date")
+        return table.to_pandas()
+
+    def between(self, df, start, end, farms=None, disconnected_only=False, columns=None):
+        return self.query(start, end, farms, disconnected_only, columns)
+
+    def day(self, df, day, farms=None, disconnected_only=False, columns=None):
+        day = pd.Timestamp(day).normalize()
+        end = day + timedelta(days=1) - timedelta(microseconds=1)
+        return self.query(day, end, farms, disconnected_only, columns)
+
+    def iter_months(self, columns=None, farms=None, disconnected_only=False):
+        """Rows of each month in date order, one frame per month."""
+        for month in self.months:
+            start = pd.Timestamp(f"{month}-01")
+            end = start + pd.offsets.MonthBegin(1) - timedelta(microseconds=1)
+            yield self.query(start, end, farms, disconnected_only, columns)
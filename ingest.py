@@ -0,0 +1,335 @@
+import hashlib
+import importlib.util
+import io
+
+import chardet
+import numpy as np
+import pandas as pd
+
+from date_index import sort_by_entry_date
+
+# Size of the blocks read when hashing an upload
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Bytes handed to chardet; detecting on the whole upload is slow on big files
+ENCODING_SAMPLE_SIZE = 64 * 1024
+
+# Rows parsed per chunk in streaming mode, and the CSV size from which the
+# upload page switches to it. With compact_chunks, peak memory while reading
+# is about two parsed chunks on top of the categorical rows kept so far; the
+# final union then briefly holds those codes twice.
+CHUNK_ROWS = 200_000
+STREAMING_THRESHOLD_BYTES = 50 * 1024 * 1024
+
+SUPPORTED_EXTENSIONS = (".csv", ".xls", ".xlsx")
+
+# Columns of each file the dashboard uses; the rest are never parsed
+MASTER_COLUMNS = ("farm_name", "Cluster", "farm_status", "vcm_name")
+DEVICE_COLUMNS = ("farm_name", "gatewayid", "deviceid")
+DISCONNECTED_COLUMNS = ("entry_date", "farm_name", "deviceid", "tag_number", "gatewayid", "Device_type", "data_quality")
+ID_COLUMNS = ("deviceid", "tag_number", "gatewayid")
+LABEL_COLUMNS = ("Device_type", "data_quality")
+# Join keys read as text from CSV exports, so "00123" keeps its zeros and
+# every file yields the same keys whether it is streamed or not
+TEXT_COLUMNS = ("farm_name",) + ID_COLUMNS
+
+# Excel is read with the Rust calamine engine when python-calamine is
+# installed (pandas 2.2+); otherwise pandas picks its default engine
+_PANDAS_VERSION = tuple(int(part) for part in pd.__version__.split(".")[:2])
+EXCEL_ENGINE = (
+    "calamine"
+    if _PANDAS_VERSION >= (2, 2) and importlib.util.find_spec("python_calamine") is not None
+    else None
+)
+
+
+class IngestCancelled(Exception):
+    """Raised inside a reader whose cancel check fired."""
+
+
+class ProgressFile(io.RawIOBase):
+    """Read-only view of an upload reporting progress as the parser reads it.
+
+    ``progress`` gets the fraction of bytes read; ``cancelled`` is checked
+    before every read and stops the parser with IngestCancelled.
+    """
+
+    def __init__(self, uploaded_file, progress=None, cancelled=None):
+        self._file = uploaded_file
+        self._total = file_size(uploaded_file) or 1
+        self._progress = progress
+        self._cancelled = cancelled
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._cancelled is not None and self._cancelled():
+            raise IngestCancelled()
+        data = self._file.read(len(buffer))
+        buffer[:len(data)] = data
+        if self._progress is not None:
+            self._progress(min(self._file.tell() / self._total, 1.0))
+        return len(data)
+
+
+def dataset_fingerprint(*uploaded_files):
+    """Content hash of the uploaded files, used as the dataset version id."""
+    digest = hashlib.sha256()
+    for uploaded_file in uploaded_files:
+        uploaded_file.seek(0)
+        while True:
+            block = uploaded_file.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+        uploaded_file.seek(0)
+        # Separate files so that moving bytes between them changes the hash
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def derived_version(parent_version, *uploaded_files):
+    """Version id of a dataset built by appending files to an existing one."""
+    digest = hashlib.sha256(parent_version.encode())
+    digest.update(dataset_fingerprint(*uploaded_files).encode())
+    return digest.hexdigest()[:16]
+
+
+def detect_encoding(uploaded_file, sample_size=ENCODING_SAMPLE_SIZE):
+    uploaded_file.seek(0)
+    sample = uploaded_file.read(sample_size)
+    # A plain-ASCII sample says nothing about the rest of the file: detect
+    # from the first block holding other bytes, found with a cheap scan
+    while sample.isascii():
+        block = uploaded_file.read(HASH_BLOCK_SIZE)
+        if not block:
+            break
+        if not block.isascii():
+            sample = block
+    uploaded_file.seek(0)
+    encoding = chardet.detect(sample)["encoding"] or "utf-8"
+    # Only ASCII anywhere; UTF-8 reads it the same
+    if encoding.lower() == "ascii":
+        encoding = "utf-8"
+    return encoding
+
+
+def column_filter(columns):
+    # usecols callable matching header names the way normalization strips them
+    return lambda column: str(column).strip() in columns
+
+
+def read_table(uploaded_file, columns=None, progress=None, cancelled=None):
+    """Read a CSV or Excel upload (or file opened in binary mode).
+
+    ``columns`` limits parsing to those columns. ``progress`` and
+    ``cancelled`` are as for ProgressFile; Excel workbooks are parsed in
+    one go, so they only report completion and are cancelled before parsing.
+    Raises ValueError for unsupported extensions; parser errors propagate.
+    """
+    file_name = uploaded_file.name.lower()
+    usecols = column_filter(columns) if columns else None
+    if file_name.endswith(".csv"):
+        # Detect from a bounded sample instead of every byte of the upload
+        encoding = detect_encoding(uploaded_file)
+        header = pd.read_csv(uploaded_file, encoding=encoding, nrows=0).columns
+        uploaded_file.seek(0)
+        dtype = {column: str for column in header if str(column).strip() in TEXT_COLUMNS}
+        source = uploaded_file
+        if progress is not None or cancelled is not None:
+            source = ProgressFile(uploaded_file, progress, cancelled)
+        return pd.read_csv(source, encoding=encoding, usecols=usecols, dtype=dtype)
+    if file_name.endswith((".xls", ".xlsx")):
+        if cancelled is not None and cancelled():
+            raise IngestCancelled()
+        df = pd.read_excel(uploaded_file, engine=EXCEL_ENGINE, usecols=usecols)
+        if progress is not None:
+            progress(1.0)
+        return df
+    raise ValueError(f"Unsupported file format: {file_name}. Upload .csv, .xls, or .xlsx only.")
+
+
+def file_size(uploaded_file):
+    size = getattr(uploaded_file, "size", None)
+    if size is None:
+        position = uploaded_file.tell()
+        size = uploaded_file.seek(0, 2)
+        uploaded_file.seek(position)
+    return size
+
+
+def normalize_label(series):
+    # Lower-case and strip text values, keeping missing values missing
+    return series.where(series.isna(), series.astype(str).str.strip().str.lower())
+
+
+def as_text(series):
+    # Whole floats come from integer columns that also hold blanks
+    missing = series.isna()
+    if pd.api.types.is_float_dtype(series) and (series.dropna() % 1 == 0).all():
+        series = series.astype("Int64")
+    # Converted explicitly: where() alone would keep a numeric dtype
+    return series.astype(str).where(~missing)
+
+
+def normalize_id(series):
+    # Compare ids as text across files
+    return as_text(series).str.strip()
+
+
+def parse_entry_date(series):
+    cleaned = (
+        series
+        .astype(str)
+        .str.strip()
+        .str.replace(r"\s+", "", regex=True)
+    )
+    return pd.to_datetime(cleaned, dayfirst=True, errors="coerce")
+
+
+def normalize_ids(df):
+    for column in ID_COLUMNS:
+        if column in df.columns:
+            df[column] = normalize_id(df[column])
+    if "farm_name" in df.columns:
+        # Numeric farm names (e.g. Excel cells) become text as in CSV exports
+        df["farm_name"] = as_text(df["farm_name"])
+    return df
+
+
+def normalize_disconnected_chunk(chunk, cluster_map):
+    """Normalize rows of the disconnected export in place.
+
+    Expects stripped column names; validation of the whole file is left to
+    the caller so that it can run chunk by chunk.
+    """
+    chunk["entry_date"] = parse_entry_date(chunk["entry_date"])
+    for column in LABEL_COLUMNS:
+        if column in chunk.columns:
+            chunk[column] = normalize_label(chunk[column])
+    normalize_ids(chunk)
+    if cluster_map is not None:
+        chunk["Cluster"] = chunk["farm_name"].map(cluster_map)
+    return chunk
+
+
+def validate_entry_dates(disconnected_df):
+    if disconnected_df["entry_date"].isna().all():
+        raise ValueError(
+            "All dates in 'entry_date' failed to parse. Ensure format is DD-MM-YYYY or clean invisible characters."
+        )
+
+
+def cluster_map_for(master_df):
+    return master_df.set_index("farm_name")["Cluster"].to_dict()
+
+
+def join_clusters(disconnected_df, master_df):
+    """Add the Cluster of each row's farm, for rows streamed without master_df."""
+    farms = disconnected_df["farm_name"]
+    if isinstance(farms.dtype, pd.CategoricalDtype):
+        # Map each farm once and expand through the codes, keeping Cluster compact
+        clusters = pd.Categorical(farms.cat.categories.map(cluster_map_for(master_df)))
+        # Code -1 (no farm) picks the appended -1 (no cluster)
+        codes = np.append(clusters.codes, -1)[farms.cat.codes.to_numpy()]
+        cluster = pd.Categorical.from_codes(codes, clusters.categories)
+        return disconnected_df.assign(Cluster=cluster)
+    return disconnected_df.assign(Cluster=farms.map(cluster_map_for(master_df)))
+
+
+def normalize_disconnected_df(disconnected_df, master_df):
+    """Return a normalized copy of the disconnected device export, sorted by date.
+
+    Raises ValueError when ``entry_date`` is missing or cannot be parsed.
+    """
+    disconnected_df = disconnected_df.copy()
+    disconnected_df.columns = disconnected_df.columns.str.strip()
+    if "entry_date" not in disconnected_df.columns:
+        raise ValueError("Column 'entry_date' not found in disconnected device file.")
+
+    disconnected_df = normalize_disconnected_chunk(disconnected_df, cluster_map_for(master_df))
+    validate_entry_dates(disconnected_df)
+    return sort_by_entry_date(disconnected_df)
+
+
+def normalize_master_df(master_df):
+    master_df = master_df.copy()
+    master_df.columns = master_df.columns.str.strip()
+    if "farm_name" in master_df.columns:
+        master_df["farm_name"] = as_text(master_df["farm_name"])
+    return master_df
+
+
+def normalize_device_df(device_df):
+    device_df = device_df.copy()
+    device_df.columns = device_df.columns.str.strip()
+    return normalize_ids(device_df)
+
+
+def normalize_dataset(master_df, device_df, disconnected_df):
+    """Normalize the three uploaded frames once, right after upload."""
+    master_df = normalize_master_df(master_df)
+    device_df = normalize_device_df(device_df)
+    disconnected_df = normalize_disconnected_df(disconnected_df, master_df)
+    return master_df, device_df, disconnected_df
+
+
+def iter_disconnected_csv(uploaded_file, master_df, chunk_rows=CHUNK_ROWS, progress=None, cancelled=None):
+    """Yield normalized chunks of a disconnected CSV export.
+
+    Only the dashboard columns are parsed, ids are read as text, and every
+    chunk is normalized before the next one is read. ``master_df`` must be
+    normalized already; when it is None the Cluster column is left for
+    join_clusters(). ``progress`` is called with the fraction of bytes
+    consumed after each chunk, and ``cancelled`` is checked before each one.
+    """
+    encoding = detect_encoding(uploaded_file)
+    total_bytes = file_size(uploaded_file) or 1
+    cluster_map = cluster_map_for(master_df) if master_df is not None else None
+
+    reader = pd.read_csv(
+        uploaded_file,
+        encoding=encoding,
+        usecols=lambda column: column.strip() in DISCONNECTED_COLUMNS,
+        dtype=str,
+        chunksize=chunk_rows,
+    )
+    with reader:
+        for chunk in reader:
+            if cancelled is not None and cancelled():
+                raise IngestCancelled()
+            chunk.columns = chunk.columns.str.strip()
+            if "entry_date" not in chunk.columns:
+                raise ValueError("Column 'entry_date' not found in disconnected device file.")
+            yield normalize_disconnected_chunk(chunk, cluster_map)
+            if progress is not None:
+                progress(min(uploaded_file.tell() / total_bytes, 1.0))
+
+
+def iter_disconnected_file(uploaded_file, master_df, progress=None, cancelled=None):
+    """Normalized chunks of a disconnected export: streamed for CSV, whole for Excel."""
+    if uploaded_file.name.lower().endswith(".csv"):
+        yield from iter_disconnected_csv(uploaded_file, master_df, progress=progress, cancelled=cancelled)
+    else:
+        disconnected_df = read_table(uploaded_file, DISCONNECTED_COLUMNS, progress, cancelled)
+        yield normalize_disconnected_df(disconnected_df, master_df)
+
+
+def concat_chunks(chunks):
+    chunks = list(chunks)
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+
+def read_disconnected_csv(uploaded_file, master_df, chunk_rows=CHUNK_ROWS, progress=None, cancelled=None, combine=None):
+    """Stream a disconnected CSV export into a normalized frame (see iter_disconnected_csv).
+
+    ``combine`` joins the chunks as they are read; compact_chunks keeps
+    them categorical so the text of the whole export is never held at once.
+    """
+    chunks = iter_disconnected_csv(uploaded_file, master_df, chunk_rows, progress, cancelled)
+    disconnected_df = (combine or concat_chunks)(chunks)
+    if disconnected_df.empty:
+        raise ValueError("Disconnected device file is empty.")
+    validate_entry_dates(disconnected_df)
+    return sort_by_entry_date(disconnected_df)
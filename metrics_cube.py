@@ -0,0 +1,99 @@
+import pandas as pd
+
+CUBE_KEYS = ["entry_date", "Cluster", "farm_name", "Device_type", "data_quality"]
+FARM_DAY_KEYS = ["entry_date", "Cluster", "farm_name"]
+
+
+class MetricsCube:
+    """Daily aggregates of the disconnected history.
+
+    ``cells`` holds row and distinct device counts per
+    (day, cluster, farm, device type, data_quality). ``farm_days`` holds the
+    distinct device and disconnected device counts per (day, cluster, farm),
+    which cannot be summed from the cells when a device reports several
+    rows a day. Distinct counts are summed across farms, as a device belongs
+    to a single farm.
+    """
+
+    def __init__(self, cells, farm_days):
+        self.cells = cells
+        self.farm_days = farm_days
+
+    def restrict(self, farms):
+        """Cube limited to the given farm names."""
+        return MetricsCube(
+            self.cells[self.cells["farm_name"].isin(farms)],
+            self.farm_days[self.farm_days["farm_name"].isin(farms)],
+        )
+
+    def days(self, farms=None):
+        """Sorted days with any rows, optionally limited to some farms."""
+        farm_days = self.farm_days
+        if farms is not None:
+            farm_days = farm_days[farm_days["farm_name"].isin(farms)]
+        return pd.DatetimeIndex(farm_days["entry_date"].unique()).sort_values()
+
+    def day_counts(self, day, farms=None):
+        """Device counts for one day, optionally limited to some farms."""
+        day = pd.Timestamp(day).normalize()
+        cells = self.cells[self.cells["entry_date"] == day]
+        farm_days = self.farm_days[self.farm_days["entry_date"] == day]
+        if farms is not None:
+            cells = cells[cells["farm_name"].isin(farms)]
+            farm_days = farm_days[farm_days["farm_name"].isin(farms)]
+
+        disconnected = cells[cells["data_quality"] == "disconnected"]
+        return {
+            "total_devices": int(farm_days["devices"].sum()),
+            "disconnected_devices": int(farm_days["disconnected_devices"].sum()),
+            "type_rows": cells.groupby("Device_type", observed=True)["rows"].sum().to_dict(),
+            "disconnected_type_rows": disconnected.groupby("Device_type", observed=True)["rows"].sum().to_dict(),
+        }
+
+    def device_trend(self, start_date, end_date, selected_cluster="All", selected_farm="All", selected_device_type="All"):
+        """Distinct disconnected devices per day between two dates."""
+        if selected_device_type != "All":
+            frame = self.cells[
+                (self.cells["data_quality"] == "disconnected") &
+                (self.cells["Device_type"] == selected_device_type)
+            ]
+            column = "devices"
+        else:
+            frame = self.farm_days[self.farm_days["disconnected_devices"] > 0]
+            column = "disconnected_devices"
+
+        frame = frame[(frame["entry_date"] >= start_date) & (frame["entry_date"] <= end_date)]
+        if selected_cluster != "All":
+            frame = frame[frame["Cluster"] == selected_cluster]
+        if selected_farm != "All":
+            frame = frame[frame["farm_name"] == selected_farm]
+
+        trend = frame.groupby("entry_date")[column].sum()
+        trend = trend[trend > 0]
+        return trend.rename("Disconnected Devices").reset_index()
+
+
+def build_metrics_cube(disconnected_df):
+    """Aggregate a normalized disconnected history into a MetricsCube."""
+    rows = disconnected_df[disconnected_df["entry_date"].notna()]
+    rows = rows.assign(entry_date=rows["entry_date"].dt.normalize())
+
+    cells = (
+        rows.groupby(CUBE_KEYS, dropna=False, observed=True)
+        .agg(rows=("deviceid", "size"), devices=("deviceid", "nunique"))
+        .reset_index()
+    )
+
+    is_disconnected = rows["data_quality"] == "disconnected"
+    farm_days = rows.groupby(FARM_DAY_KEYS, dropna=False, observed=True)["deviceid"].nunique().rename("devices")
+    disconnected_days = (
+        rows[is_disconnected]
+        .groupby(FARM_DAY_KEYS, dropna=False, observed=True)["deviceid"].nunique()
+        .rename("disconnected_devices")
+    )
+    farm_days = pd.concat([farm_days, disconnected_days], axis=1).fillna(0).astype(int).reset_index()
+
+    return MetricsCube(
+        cells.sort_values("entry_date", kind="stable").reset_index(drop=True),
+        farm_days.sort_values("entry_date", kind="stable").reset_index(drop=True),
+    )
@@ -0,0 +1,116 @@
+from datetime import timedelta
+
+import pandas as pd
+
+from gateway_outage import fully_down_gateway_counts
+
+# Levels a grid can be computed at: one row per farm, per cluster, or overall
+GRID_SCOPES = ("farm", "cluster", "all")
+
+# Device types counted separately; every other device is type A
+TYPE_LABELS = {"b type": "b", "c type": "c"}
+
+GRID_COLUMNS = [
+    "entry_date", "Cluster", "farm_name",
+    "total_devices", "a_type_devices", "b_type_devices", "c_type_devices",
+    "disconnected_devices", "a_type_disconnected", "b_type_disconnected", "c_type_disconnected",
+    "gateway_count", "disconnected_gateways",
+]
+
+
+def _scope_map(master_df, by):
+    # farm_name -> label of the row the farm is counted in
+    clusters = master_df.drop_duplicates("farm_name").set_index("farm_name")["Cluster"].astype(object)
+    clusters.index = clusters.index.astype(object)
+    if by == "farm":
+        return pd.Series(clusters.index, index=clusters.index)
+    if by == "cluster":
+        return clusters
+    if by == "all":
+        return pd.Series("All", index=clusters.index)
+    raise ValueError(f"Unknown grid scope: {by}")
+
+
+def _in_scope(frame, days, scope_of):
+    frame = frame[frame["entry_date"].isin(days) & frame["farm_name"].isin(scope_of.index)]
+    return frame.assign(scope=frame["farm_name"].map(scope_of).astype(object))
+
+
+def _type_rows(cells, index):
+    rows = (
+        cells.assign(Device_type=cells["Device_type"].astype(object))
+        .groupby(["entry_date", "scope", "Device_type"])["rows"].sum()
+        .unstack("Device_type")
+    )
+    return rows.reindex(index=index, columns=list(TYPE_LABELS)).fillna(0).astype(int)
+
+
+def metrics_grid(dataset, days, by="farm", farms=None):
+    """Dashboard metrics for every day and farm (or cluster, or overall) at once.
+
+    Mirrors calculate_metrics for each (day, selection) pair with no farm
+    status filter, computed with one grouped pass over the cube and the
+    disconnected rows of the given days. Farms outside the master file are
+    left out, as is the inventory of those farms. Rows that do not apply to
+    a level hold "All", like the dashboard filters. ``farms`` limits the
+    grid to some farm names, as the farm status filter does.
+    """
+    days = pd.DatetimeIndex(days).normalize().unique().sort_values()
+    if days.empty:
+        return pd.DataFrame(columns=GRID_COLUMNS)
+    master_df = dataset.master_df
+    if farms is not None:
+        master_df = master_df[master_df["farm_name"].isin(farms)]
+    scope_of = _scope_map(master_df, by)
+    index = pd.MultiIndex.from_product([days, scope_of.unique()], names=["entry_date", "scope"])
+
+    farm_days = _in_scope(dataset.cube.farm_days, days, scope_of)
+    grid = (
+        farm_days.groupby(["entry_date", "scope"])[["devices", "disconnected_devices"]].sum()
+        .reindex(index, fill_value=0)
+        .rename(columns={"devices": "total_devices"})
+    )
+
+    cells = _in_scope(dataset.cube.cells, days, scope_of)
+    type_rows = _type_rows(cells, index)
+    disconnected_type_rows = _type_rows(cells[cells["data_quality"] == "disconnected"], index)
+    for label, prefix in TYPE_LABELS.items():
+        grid[f"{prefix}_type_devices"] = type_rows[label]
+        grid[f"{prefix}_type_disconnected"] = disconnected_type_rows[label]
+    grid["a_type_devices"] = grid["total_devices"] - grid["b_type_devices"] - grid["c_type_devices"]
+    grid["a_type_disconnected"] = (
+        grid["disconnected_devices"] - grid["b_type_disconnected"] - grid["c_type_disconnected"]
+    )
+
+    inventory = dataset.device_df[dataset.device_df["farm_name"].isin(scope_of.index)]
+    inventory = inventory.assign(scope=inventory["farm_name"].map(scope_of).astype(object))
+    gateway_counts = inventory.groupby("scope")["gatewayid"].nunique()
+    grid["gateway_count"] = gateway_counts.reindex(index.get_level_values("scope"), fill_value=0).to_numpy()
+
+    # One slice of the date-sorted history, or one query when it is on disk
+    rows = dataset.date_index.between(
+        dataset.disconnected_df, days[0], days[-1] + timedelta(days=1) - timedelta(microseconds=1),
+        disconnected_only=True, columns=["entry_date", "farm_name", "deviceid"],
+    )
+    rows = _in_scope(rows.assign(entry_date=rows["entry_date"].dt.normalize()), days, scope_of)
+    grid["disconnected_gateways"] = (
+        fully_down_gateway_counts(rows, inventory, "scope").reindex(index, fill_value=0).to_numpy()
+    )
+
+    grid = grid.reset_index()
+    if by == "farm":
+        grid["farm_name"] = grid["scope"]
+        grid["Cluster"] = grid["scope"].map(_scope_map(master_df, "cluster"))
+    else:
+        grid["farm_name"] = "All"
+        grid["Cluster"] = grid["scope"]
+    return grid[GRID_COLUMNS]
+
+
+def leaderboard(dataset, day, by="farm", farms=None):
+    """Metrics of every farm (or cluster) on one day with its disconnection rate."""
+    board = metrics_grid(dataset, [day], by, farms)
+    board["disconnection_rate"] = (
+        board["disconnected_devices"] / board["total_devices"].where(board["total_devices"] > 0) * 100
+    ).fillna(0.0)
+    return board.drop(columns="entry_date")
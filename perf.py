@@ -0,0 +1,146 @@
+import json
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+# Reruns kept for the admin Performance panel
+PERF_HISTORY_SIZE = 500
+
+
+class PerfRecorder:
+    """Process-wide history of per-rerun stage timings.
+
+    Recording is off by default; while it is off ``stage()`` costs one
+    session-state lookup.
+    """
+
+    def __init__(self, history_size=PERF_HISTORY_SIZE):
+        self.enabled = False
+        self._runs = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+
+    def set_enabled(self, enabled):
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not enabled and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.enabled = enabled
+
+    def add(self, run):
+        with self._lock:
+            self._runs.append(run)
+
+    def runs(self):
+        with self._lock:
+            return list(self._runs)
+
+    def clear(self):
+        with self._lock:
+            self._runs.clear()
+
+
+@st.cache_resource
+def get_recorder():
+    return PerfRecorder()
+
+
+def begin_run(page):
+    """Start recording this rerun, if recording is on."""
+    if not get_recorder().enabled:
+        st.session_state.perf_run = None
+        return
+    st.session_state.perf_run = {
+        "timestamp": datetime.now().isoformat(timespec="milliseconds"),
+        "page": page,
+        "user": st.session_state.get("username", ""),
+        "filters": {},
+        "stages": [],
+        "_start": time.perf_counter(),
+    }
+
+
+def tag_run(**filters):
+    run = st.session_state.get("perf_run")
+    if run is not None:
+        run["filters"].update({key: str(value) for key, value in filters.items()})
+
+
+def finish_run():
+    run = st.session_state.get("perf_run")
+    if run is None:
+        return
+    st.session_state.perf_run = None
+    run["total_seconds"] = time.perf_counter() - run.pop("_start")
+    run.pop("_peaks", None)
+    get_recorder().add(run)
+
+
+@contextmanager
+def stage(name):
+    """Record wall time and traced allocations of a named stage.
+
+    Memory is the peak of traced memory during the stage above its level at
+    the start, so temporaries freed before the stage ends still count; with
+    several sessions rerunning at once it also includes their allocations.
+    """
+    run = st.session_state.get("perf_run")
+    if run is None or not tracemalloc.is_tracing():
+        yield
+        return
+
+    memory_before, peak_before = tracemalloc.get_traced_memory()
+    # An enclosing stage keeps the peak it reached before this one resets it
+    peaks = run.setdefault("_peaks", [])
+    if peaks:
+        peaks[-1] = max(peaks[-1], peak_before)
+    peaks.append(0)
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        peak = max(peak, peaks.pop())
+        if peaks:
+            peaks[-1] = max(peaks[-1], peak)
+        run["stages"].append({"name": name, "seconds": seconds, "memory_bytes": peak - memory_before})
+
+
+def stage_frame(runs):
+    """One row per recorded stage, tagged with its run's filters."""
+    rows = []
+    for run in runs:
+        for recorded in run["stages"]:
+            rows.append(dict(
+                timestamp=run["timestamp"], page=run["page"], user=run["user"],
+                **run["filters"], stage=recorded["name"],
+                seconds=recorded["seconds"], memory_bytes=recorded["memory_bytes"],
+            ))
+    return pd.DataFrame(rows)
+
+
+def stage_percentiles(runs):
+    """p50/p90/p99 wall time and mean allocation per stage."""
+    stages = stage_frame(runs)
+    if stages.empty:
+        return stages
+    grouped = stages.groupby("stage")
+    summary = pd.DataFrame({
+        "runs": grouped.size(),
+        "p50_ms": grouped["seconds"].quantile(0.5) * 1000,
+        "p90_ms": grouped["seconds"].quantile(0.9) * 1000,
+        "p99_ms": grouped["seconds"].quantile(0.99) * 1000,
+        "mean_memory_kb": grouped["memory_bytes"].mean() / 1024,
+    })
+    return summary.sort_values("p90_ms", ascending=False).reset_index()
+
+
+def runs_jsonl(runs):
+    return "".join(json.dumps(run) + "\n" for run in runs)
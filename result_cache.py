@@ -0,0 +1,94 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import streamlit as st
+
+# Memory budget for cached metric and trend results
+RESULT_CACHE_BYTES = int(os.environ.get("FARM_RESULT_CACHE_MB", "256")) * 1024 * 1024
+
+
+def estimate_size(value):
+    """Approximate bytes held by a result (frames, containers and scalars)."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """Process-wide LRU cache of dashboard results.
+
+    Keys are tuples of (kind, dataset version, *filters); values are shared
+    by every session and must be treated as read-only. The least recently
+    used entries are dropped once the estimated size exceeds ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes=RESULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+
+        # Computed outside the lock; concurrent misses on one key both compute
+        value = compute()
+        size = estimate_size(value)
+        with self._lock:
+            if size <= self.max_bytes and key not in self._entries:
+                self._entries[key] = (value, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    _, (_, evicted_size) = self._entries.popitem(last=False)
+                    self._bytes -= evicted_size
+                    self.evictions += 1
+        return value
+
+    def invalidate(self, versions):
+        """Drop every entry computed for the given dataset versions."""
+        versions = set(versions)
+        with self._lock:
+            for key in [key for key in self._entries if key[1] in versions]:
+                _, size = self._entries.pop(key)
+                self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+@st.cache_resource
+def get_result_cache():
+    return ResultCache()
@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+DEVICE_ATTRIBUTES = ["tag_number", "farm_name", "Cluster", "Device_type"]
+
+
+def disconnection_runs(events, key, days):
+    """Runs of consecutive days on which each ``key`` value was disconnected.
+
+    ``events`` holds one row per (key, day) with days in a normalized
+    entry_date column; ``days`` is the sorted index of days in the history.
+    Consecutive means adjacent in ``days``, so days without any export do
+    not break a run. A run is ongoing when it reaches the last day.
+    Computed with one sort and a run-length encoding, without a per-key loop.
+    """
+    codes, uniques = pd.factorize(events[key], sort=False)
+    positions = days.get_indexer(events["entry_date"])
+    valid = (codes >= 0) & (positions >= 0)
+    codes, positions = codes[valid], positions[valid]
+
+    order = np.lexsort((positions, codes))
+    codes, positions = codes[order], positions[order]
+    starts = np.ones(len(codes), dtype=bool)
+    starts[1:] = (codes[1:] != codes[:-1]) | (positions[1:] != positions[:-1] + 1)
+    first = np.flatnonzero(starts)
+    last = np.append(first[1:] - 1, len(codes) - 1) if len(first) else first
+
+    return pd.DataFrame({
+        key: uniques.take(codes[first]),
+        "start": days.take(positions[first]),
+        "end": days.take(positions[last]),
+        "days": last - first + 1,
+        "ongoing": positions[last] == len(days) - 1,
+    })
+
+
+def summarize_runs(runs, keys):
+    """Current streak, longest streak, outage count and MTTR per ``keys``.
+
+    MTTR (mean time to reconnect) is the mean length in days of the runs
+    that have ended; it is missing while the only run is still ongoing.
+    """
+    runs = runs.assign(
+        current=runs["days"].where(runs["ongoing"], 0),
+        ended_days=runs["days"].where(~runs["ongoing"]),
+    )
+    return (
+        runs.groupby(keys, observed=True, dropna=False)
+        .agg(
+            current_streak=("current", "max"),
+            longest_streak=("days", "max"),
+            outages=("days", "size"),
+            mttr_days=("ended_days", "mean"),
+            last_disconnected=("end", "max"),
+        )
+        .reset_index()
+    )
+
+
+def join_runs(runs, key, days):
+    """Merge runs that continue one another, as found in separately scanned months."""
+    runs = runs.sort_values([key, "start"], kind="stable").reset_index(drop=True)
+    codes, _ = pd.factorize(runs[key])
+    starts = days.get_indexer(runs["start"])
+    ends = days.get_indexer(runs["end"])
+    first = np.ones(len(runs), dtype=bool)
+    first[1:] = (codes[1:] != codes[:-1]) | (starts[1:] != ends[:-1] + 1)
+    groups = runs.groupby(np.cumsum(first), sort=False)
+    return pd.DataFrame({
+        key: groups[key].first().to_numpy(),
+        "start": groups["start"].first().to_numpy(),
+        "end": groups["end"].last().to_numpy(),
+        "days": groups["days"].sum().to_numpy(),
+        "ongoing": groups["ongoing"].last().to_numpy(),
+    })
+
+
+def device_runs(dataset):
+    """Disconnection runs of every device, with its farm, cluster and type.
+
+    A history on disk or in segments is read one month at a time and runs
+    crossing a month end are joined afterwards.
+    """
+    days = dataset.date_index.days
+    if dataset.disconnected_df is None:
+        parts = dataset.date_index.iter_months(
+            columns=["entry_date", "deviceid", "data_quality", *DEVICE_ATTRIBUTES], disconnected_only=True
+        )
+    else:
+        parts = [dataset.disconnected_df]
+
+    runs, attributes = [], []
+    for rows in parts:
+        rows = rows[(rows["data_quality"] == "disconnected") & rows["deviceid"].notna() & rows["entry_date"].notna()]
+        events = pd.DataFrame({"deviceid": rows["deviceid"], "entry_date": rows["entry_date"].dt.normalize()})
+        runs.append(disconnection_runs(events.drop_duplicates(), "deviceid", days))
+        # A device's attributes are taken from its latest row
+        attributes.append(rows.drop_duplicates("deviceid", keep="last")[["deviceid", *DEVICE_ATTRIBUTES]])
+
+    if len(runs) == 1:
+        runs, attributes = runs[0], attributes[0]
+    else:
+        runs = join_runs(pd.concat(runs, ignore_index=True), "deviceid", days)
+        attributes = pd.concat(attributes, ignore_index=True).drop_duplicates("deviceid", keep="last")
+    return runs.join(attributes.set_index("deviceid"), on="deviceid")
+
+
+def gateway_runs(dataset):
+    """Runs of days on which every device of a gateway was disconnected.
+
+    Based on Dataset.gateway_outages, so limited to farms in the master file.
+    """
+    outages = dataset.gateway_outages
+    down = outages.loc[outages["disconnected_devices"] == outages["gateway_devices"], ["gatewayid", "entry_date"]]
+    runs = disconnection_runs(down, "gatewayid", dataset.date_index.days)
+
+    inventory = dataset.device_df.dropna(subset=["gatewayid"]).drop_duplicates("gatewayid")
+    farms = inventory.set_index("gatewayid")["farm_name"]
+    clusters = dataset.master_df.drop_duplicates("farm_name").set_index("farm_name")["Cluster"]
+    runs = runs.join(farms, on="gatewayid")
+    return runs.assign(Cluster=runs["farm_name"].map(clusters))
@@ -0,0 +1,20 @@
+import pandas as pd
+
+from batch_report import report_days
+from dataset import build_dataset
+
+
+def test_days_are_counted_back_from_the_newest_day():
+    master_df = pd.DataFrame({"farm_name": ["F1"], "Cluster": ["C1"], "farm_status": ["Active"], "vcm_name": ["V"]})
+    device_df = pd.DataFrame({"farm_name": ["F1"], "gatewayid": ["G1"], "deviceid": ["D1"]})
+    # No rows on 2024-01-08, so the last 3 days hold two of them
+    dates = ["01-01-2024", "05-01-2024", "07-01-2024", "09-01-2024"]
+    disconnected_df = pd.DataFrame({
+        "entry_date": dates, "farm_name": "F1", "deviceid": "D1", "tag_number": "T1",
+        "gatewayid": "G1", "Device_type": "A type", "data_quality": "Disconnected",
+    })
+    dataset = build_dataset("v", master_df, device_df, disconnected_df)
+
+    assert list(report_days(dataset, last=3)) == list(pd.to_datetime(["2024-01-07", "2024-01-09"]))
+    assert list(report_days(dataset, last=1)) == [pd.Timestamp("2024-01-09")]
+    assert len(report_days(dataset, last=365)) == 4
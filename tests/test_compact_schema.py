@@ -0,0 +1,16 @@
+import pandas as pd
+
+from compact_schema import compact_frames
+
+
+def test_mixed_number_and_text_values_share_categories():
+    master_df = pd.DataFrame({"farm_name": [101, 102], "Cluster": [1, 2]})
+    device_df = pd.DataFrame({"farm_name": ["101"], "gatewayid": [7], "deviceid": ["00123"]})
+    disconnected_df = pd.DataFrame({"farm_name": ["102"], "deviceid": [123.0], "Cluster": ["2"]})
+
+    master_df, device_df, disconnected_df = compact_frames(master_df, device_df, disconnected_df)
+
+    assert master_df["farm_name"].astype(str).tolist() == ["101", "102"]
+    assert master_df["farm_name"].dtype == device_df["farm_name"].dtype == disconnected_df["farm_name"].dtype
+    assert disconnected_df["deviceid"].astype(str).tolist() == ["123"]
+    assert disconnected_df["Cluster"].astype(str).tolist() == ["2"]
@@ -0,0 +1,18 @@
+from types import SimpleNamespace
+
+from dataset_registry import DatasetRegistry
+
+
+def test_registering_for_a_session_protects_the_version_from_eviction():
+    registry = DatasetRegistry()
+    registry.acquire("uploader", "old")
+    registry.register(SimpleNamespace(version="old"))
+
+    registry.register(SimpleNamespace(version="new"), "uploader")
+    registry.register(SimpleNamespace(version="unbound"))
+    # Another session's rerun evicts unused versions before the upload is saved
+    registry.acquire("other", "old")
+    evicted = registry.evict_unused()
+
+    assert evicted == ["unbound"]
+    assert registry.get("new") is not None
@@ -0,0 +1,79 @@
+import os
+
+import pandas as pd
+
+import dataset_store
+from dataset import append_days, build_dataset
+from dataset_store import list_versions, load_dataset_version, prune_ancestors, save_dataset, set_active_version
+
+
+def _dataset(version):
+    master_df = pd.DataFrame({"farm_name": ["F1"], "Cluster": ["C1"], "farm_status": ["Active"], "vcm_name": ["V"]})
+    device_df = pd.DataFrame({"farm_name": ["F1"], "gatewayid": ["G1"], "deviceid": ["D1"]})
+    disconnected_df = pd.DataFrame({
+        "entry_date": ["05-01-2024"], "farm_name": ["F1"], "deviceid": ["D1"], "tag_number": ["T1"],
+        "gatewayid": ["G1"], "Device_type": ["A type"], "data_quality": ["Disconnected"],
+    })
+    return build_dataset(version, master_df, device_df, disconnected_df)
+
+
+def test_prune_ancestors_keeps_newest_versions_of_an_append_chain(tmp_path):
+    store_dir = str(tmp_path)
+    save_dataset(_dataset("other"), store_dir=store_dir)
+    parent = None
+    for version in ["v1", "v2", "v3", "v4"]:
+        save_dataset(_dataset(version), parent_version=parent, store_dir=store_dir)
+        parent = version
+    set_active_version("v4", store_dir)
+
+    assert prune_ancestors("v4", keep=2, store_dir=store_dir) == ["v2", "v1"]
+    assert sorted(manifest["version"] for manifest in list_versions(store_dir)) == ["other", "v3", "v4"]
+    assert sorted(os.listdir(store_dir)) == ["ACTIVE", "other", "v3", "v4"]
+
+    save_dataset(_dataset("v5"), parent_version="v4", store_dir=store_dir)
+    set_active_version("v5", store_dir)
+    assert prune_ancestors("v5", keep=2, store_dir=store_dir) == ["v3"]
+
+
+def _history(days):
+    return pd.DataFrame({
+        "entry_date": [f"{day:02d}-01-2024" for day in days for _ in range(2)],
+        "farm_name": ["F1"] * 2 * len(days), "deviceid": ["D1", "D2"] * len(days), "tag_number": ["T1", "T2"] * len(days),
+        "gatewayid": ["G1"] * 2 * len(days), "Device_type": ["A type"] * 2 * len(days),
+        "data_quality": ["Disconnected", "Good"] * len(days),
+    })
+
+
+def _frames(history):
+    master_df = pd.DataFrame({"farm_name": ["F1"], "Cluster": ["C1"], "farm_status": ["Active"], "vcm_name": ["V"]})
+    device_df = pd.DataFrame({"farm_name": ["F1", "F1"], "gatewayid": ["G1", "G1"], "deviceid": ["D1", "D2"]})
+    return master_df, device_df, history
+
+
+def test_appended_days_are_stored_as_deltas_on_their_parent(tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset_store, "MAX_DELTA_CHAIN", 2)
+    store_dir = str(tmp_path)
+    full = build_dataset("full", *_frames(_history(range(1, 6))))
+    dataset = build_dataset("v1", *_frames(_history([1, 2])))
+    save_dataset(dataset, store_dir=store_dir)
+    for day in [3, 4, 5]:
+        new_rows = build_dataset("day", *_frames(_history([day]))).disconnected_df
+        appended, count = append_days(dataset, new_rows, f"v{day - 1}")
+        assert count == 2
+        save_dataset(appended, parent_version=dataset.version, store_dir=store_dir)
+        assert load_dataset_version(appended.version, store_dir).segments.count_rows() == 2 * day
+        set_active_version(appended.version, store_dir)
+        prune_ancestors(appended.version, keep=1, store_dir=store_dir)
+        dataset = appended
+
+    depths = {manifest["version"]: manifest["depth"] for manifest in list_versions(store_dir)}
+    # v4 is a full copy once the chain reaches MAX_DELTA_CHAIN; v1 to v3 go with it
+    assert depths == {"v4": 0}
+    assert not os.path.exists(tmp_path / "v4" / "delta_df.feather")
+
+    for dataset in [appended, load_dataset_version("v4", store_dir)]:
+        assert dataset.segments.count_rows() == 10
+        assert list(dataset.date_index.days) == list(full.date_index.days)
+        pd.testing.assert_frame_equal(dataset.cube.cells, full.cube.cells, check_categorical=False)
+        history = dataset.segments.query()
+        assert history["deviceid"].astype(str).tolist() == full.disconnected_df["deviceid"].astype(str).tolist()
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from downsample import lttb, lttb_indices
+
+
+def test_lttb_keeps_the_ends_and_one_point_per_bucket():
+    x = pd.date_range("2024-01-01", periods=366)
+    y = np.sin(np.arange(366) / 10)
+
+    kept = lttb_indices(x, y, 150)
+
+    assert len(kept) == 150
+    assert kept[0] == 0 and kept[-1] == 365
+    assert (np.diff(kept) > 0).all()
+    edges = np.linspace(1, 365, 149).astype(int)
+    for bucket, position in enumerate(kept[1:-1]):
+        assert edges[bucket] <= position < edges[bucket + 1]
+
+
+def test_lttb_keeps_a_single_day_spike():
+    y = np.zeros(366)
+    y[200] = 50
+    df = pd.DataFrame({"entry_date": pd.date_range("2024-01-01", periods=366), "count": y})
+
+    sampled = lttb(df, "entry_date", "count", 150)
+
+    assert len(sampled) == 150
+    assert sampled["count"].max() == 50
+
+
+def test_lttb_leaves_short_series_alone():
+    assert lttb_indices(np.arange(91), np.arange(91), 150).tolist() == list(range(91))
+    assert lttb_indices(np.arange(10), np.arange(10), 2).tolist() == list(range(10))
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+from gateway_outage import daily_gateway_outage_counts, fully_down_gateway_counts, gateway_outages
+from gateway_topology import GatewayTopology
+
+DAYS = pd.date_range("2024-01-01", periods=20)
+
+
+def _inventory():
+    master_df = pd.DataFrame({"farm_name": ["F1", "F2"], "Cluster": ["C1", "C2"]})
+    # G2 serves devices of both farms
+    device_df = pd.DataFrame({
+        "farm_name": ["F1", "F1", "F1", "F2", "F2", "F2"],
+        "gatewayid": ["G1", "G1", "G2", "G2", "G3", "G3"],
+        "deviceid": ["D1", "D2", "D3", "D4", "D5", "D6"],
+    })
+    return master_df, device_df
+
+
+def _disconnected(device_df):
+    rng = np.random.default_rng(7)
+    rows = []
+    for day in DAYS:
+        for farm, device in zip(device_df["farm_name"], device_df["deviceid"]):
+            if rng.random() < 0.6:
+                rows.append({"entry_date": day, "farm_name": farm, "deviceid": device})
+        # Devices missing from the inventory never make a gateway down
+        rows.append({"entry_date": day, "farm_name": "F1", "deviceid": "DX"})
+    return pd.DataFrame(rows)
+
+
+def _baseline(device_df, disconnected_df, farm="All"):
+    # The per-day set.issubset loop the dashboard used before
+    counts = []
+    for day in DAYS:
+        day_rows = disconnected_df[disconnected_df["entry_date"] == day]
+        devices = device_df
+        if farm != "All":
+            devices = devices[devices["farm_name"] == farm]
+            day_rows = day_rows[day_rows["farm_name"] == farm]
+        gateway_devices = devices.groupby("gatewayid")["deviceid"].apply(set).to_dict()
+        disconnected_set = set(day_rows["deviceid"])
+        counts.append(sum(1 for devs in gateway_devices.values() if devs.issubset(disconnected_set)))
+    return counts
+
+
+def test_gateway_counts_match_the_per_day_subset_loop():
+    master_df, device_df = _inventory()
+    disconnected_df = _disconnected(device_df)
+    topology = GatewayTopology(device_df, master_df)
+
+    outages = gateway_outages(disconnected_df, device_df)
+    daily = daily_gateway_outage_counts(outages, DAYS[0], DAYS[-1])
+    assert daily["Disconnected Gateways"].tolist() == _baseline(device_df, disconnected_df)
+
+    by_farm = fully_down_gateway_counts(disconnected_df, device_df, "farm_name")
+    for farm in ["F1", "F2"]:
+        expected = _baseline(device_df, disconnected_df, farm)
+        assert [by_farm.get((day, farm), 0) for day in DAYS] == expected
+
+    for farm in ["All", "F1", "F2"]:
+        expected = _baseline(device_df, disconnected_df, farm)
+        segments = topology.segments(selected_farm=farm)
+        counts = []
+        for day in DAYS:
+            day_rows = disconnected_df[disconnected_df["entry_date"] == day]
+            if farm != "All":
+                day_rows = day_rows[day_rows["farm_name"] == farm]
+            status = topology.gateway_status(day_rows["deviceid"], segments)
+            counts.append(int((status["disconnected_devices"] == status["gateway_devices"]).sum()))
+        assert counts == expected
+    # Some days have G2 down for F1's view only, through D3 without D4
+    down = disconnected_df.groupby("entry_date")["deviceid"].apply(set)
+    assert any("D3" in devices and "D4" not in devices for devices in down)
@@ -0,0 +1,35 @@
+import io
+
+import pandas as pd
+
+from dataset_store import save_disk_dataset
+from ingest import iter_disconnected_file, normalize_device_df, normalize_master_df
+
+
+def _csv(df, name):
+    # Stands in for a Streamlit UploadedFile
+    upload = io.BytesIO(df.to_csv(index=False).encode())
+    upload.name = name
+    return upload
+
+
+def test_disk_history_accepts_numeric_clusters_and_missing_columns(tmp_path):
+    master_df = normalize_master_df(pd.DataFrame({
+        "farm_name": ["F1", "F2"], "Cluster": [1, 2], "farm_status": ["Active", "Active"], "vcm_name": ["V", "V"],
+    }))
+    device_df = normalize_device_df(pd.DataFrame({
+        "farm_name": ["F1", "F2"], "gatewayid": ["G1", "G2"], "deviceid": ["D1", "D2"],
+    }))
+    # No gatewayid column in the disconnected export
+    disconnected = pd.DataFrame({
+        "entry_date": ["05-01-2024", "06-01-2024"], "farm_name": ["F1", "F2"], "deviceid": ["D1", "D2"],
+        "tag_number": ["T1", "T2"], "Device_type": ["A type", "B type"], "data_quality": ["Disconnected", "Ok"],
+    })
+
+    chunks = iter_disconnected_file(_csv(disconnected, "x.csv"), master_df)
+    dataset = save_disk_dataset("v", master_df, device_df, chunks, store_dir=str(tmp_path))
+
+    rows = dataset.date_index.query()
+    assert rows["Cluster"].tolist() == ["1", "2"]
+    assert rows["gatewayid"].isna().all()
+    assert dataset.cube.day_counts("2024-01-05")["disconnected_devices"] == 1
@@ -0,0 +1,122 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from compact_schema import compact_chunks
+from dataset import build_dataset
+from ingest import (
+    DEVICE_COLUMNS, DISCONNECTED_COLUMNS, MASTER_COLUMNS, join_clusters, normalize_device_df,
+    normalize_disconnected_df, normalize_id, normalize_master_df, read_disconnected_csv, read_table,
+)
+from Metric_calculation import calculate_metrics
+
+
+def test_normalize_id_converts_ids_with_blanks_to_text():
+    ids = normalize_id(pd.Series([101.0, np.nan, 103.0]))
+    assert ids.iloc[0] == "101" and ids.iloc[2] == "103"
+    assert pd.isna(ids.iloc[1])
+
+
+def _frames():
+    master_df = pd.DataFrame({"farm_name": ["F1"], "Cluster": ["C1"], "farm_status": ["Active"], "vcm_name": ["V"]})
+    # Numeric ids; one device without a gateway
+    device_df = pd.DataFrame({
+        "farm_name": ["F1", "F1", "F1"],
+        "gatewayid": [7.0, 7.0, np.nan],
+        "deviceid": [1, 2, 3],
+    })
+    disconnected_df = pd.DataFrame({
+        "entry_date": ["05-01-2024"] * 4,
+        "farm_name": ["F1"] * 4,
+        "deviceid": [1.0, 2.0, 3.0, np.nan],
+        "tag_number": ["T1", "T2", "T3", "T4"],
+        "gatewayid": [7.0, 7.0, np.nan, np.nan],
+        "Device_type": ["A type"] * 4,
+        "data_quality": ["Disconnected"] * 4,
+    })
+    return master_df, device_df, disconnected_df
+
+
+def test_numeric_ids_with_blanks_match_across_files():
+    for compact in (True, False):
+        dataset = build_dataset("v", *_frames(), compact=compact)
+        metrics = calculate_metrics(
+            dataset.master_df, dataset.device_df, dataset.disconnected_df, "All", "All", "05-01-2024",
+            cube=dataset.cube, date_index=dataset.date_index, topology=dataset.topology,
+        )
+        assert metrics["disconnected_devices"] == 3
+        assert metrics["gateway_issues_list"] == ["7"]
+
+
+def _csv(df, name):
+    # Stands in for a Streamlit UploadedFile
+    upload = io.BytesIO(df.to_csv(index=False).encode())
+    upload.name = name
+    return upload
+
+
+def test_streamed_and_whole_reads_give_the_same_keys():
+    master_df = pd.DataFrame({"farm_name": [101], "Cluster": ["C1"], "farm_status": ["Active"], "vcm_name": ["V"]})
+    device_df = pd.DataFrame({"farm_name": [101, 101], "gatewayid": ["0007", "0007"], "deviceid": ["00123", "00124"]})
+    disconnected_df = pd.DataFrame({
+        "entry_date": ["05-01-2024", "05-01-2024"],
+        "farm_name": [101, 101],
+        "deviceid": ["00123", "00124"],
+        "tag_number": ["T1", "T2"],
+        "gatewayid": ["0007", "0007"],
+        "Device_type": ["A type", "A type"],
+        "data_quality": ["Disconnected", "Disconnected"],
+    })
+    master_df = normalize_master_df(read_table(_csv(master_df, "m.csv"), MASTER_COLUMNS))
+    device_df = normalize_device_df(read_table(_csv(device_df, "d.csv"), DEVICE_COLUMNS))
+    whole = normalize_disconnected_df(
+        read_table(_csv(disconnected_df, "x.csv"), DISCONNECTED_COLUMNS), master_df
+    )
+    streamed = read_disconnected_csv(_csv(disconnected_df, "x.csv"), master_df)
+
+    assert device_df["deviceid"].tolist() == ["00123", "00124"]
+    for rows in (whole, streamed):
+        assert rows["deviceid"].tolist() == ["00123", "00124"]
+        assert rows["farm_name"].tolist() == ["101", "101"]
+        assert rows["Cluster"].tolist() == ["C1", "C1"]
+        dataset = build_dataset("v", master_df, device_df, rows, normalized=True)
+        metrics = calculate_metrics(
+            dataset.master_df, dataset.device_df, dataset.disconnected_df, "All", "All", "05-01-2024",
+            cube=dataset.cube, date_index=dataset.date_index, topology=dataset.topology,
+        )
+        assert metrics["gateway_issues_list"] == ["0007"]
+
+
+def test_encoding_is_detected_past_an_ascii_sample():
+    rows = ["farm_name,deviceid"] + [f"Farm{i},D{i}" for i in range(8000)] + ["Fé,D-last"]
+    upload = io.BytesIO("\n".join(rows).encode("cp1252"))
+    upload.name = "m.csv"
+
+    df = read_table(upload)
+
+    assert df["farm_name"].iloc[-1] == "Fé"
+
+
+def test_compact_streamed_read_matches_plain_read():
+    master_df = normalize_master_df(pd.DataFrame({
+        "farm_name": ["F1", "F2"], "Cluster": ["C1", "C2"], "farm_status": ["Active", "Active"], "vcm_name": ["V", "V"],
+    }))
+    disconnected_df = pd.DataFrame({
+        "entry_date": ["05-01-2024", "05-01-2024", "06-01-2024", "06-01-2024", "07-01-2024"],
+        "farm_name": ["F1", "F2", "F1", "F3", "F2"],
+        "deviceid": ["D1", "D2", "D1", "D9", None],
+        "tag_number": ["T1", "T2", "T1", "T9", "T0"],
+        "gatewayid": ["G1", "G2", "G1", "G9", "G2"],
+        "Device_type": ["A type", "B type", "A type", "C type", "B type"],
+        "data_quality": ["Disconnected", "Ok", "Disconnected", "Disconnected", "Ok"],
+    })
+
+    plain = join_clusters(read_disconnected_csv(_csv(disconnected_df, "x.csv"), None, chunk_rows=2), master_df)
+    compact = join_clusters(
+        read_disconnected_csv(_csv(disconnected_df, "x.csv"), None, chunk_rows=2, combine=compact_chunks), master_df
+    )
+
+    assert isinstance(compact["deviceid"].dtype, pd.CategoricalDtype)
+    assert isinstance(compact["Cluster"].dtype, pd.CategoricalDtype)
+    pd.testing.assert_frame_equal(compact.astype(object), plain.astype(object))
@@ -0,0 +1,28 @@
+import streamlit as st
+
+from perf import begin_run, finish_run, get_recorder, stage
+
+
+def test_stage_memory_counts_temporaries_freed_within_the_stage():
+    recorder = get_recorder()
+    recorder.set_enabled(True)
+    try:
+        begin_run("test")
+        with stage("outer"):
+            with stage("temporary"):
+                temporary = bytearray(8 * 1024 * 1024)
+                del temporary
+            with stage("empty"):
+                pass
+        run = st.session_state.perf_run
+        finish_run()
+    finally:
+        recorder.set_enabled(False)
+        recorder.clear()
+
+    memory = {recorded["name"]: recorded["memory_bytes"] for recorded in run["stages"]}
+    assert memory["temporary"] >= 8 * 1024 * 1024
+    assert memory["empty"] < 1024 * 1024
+    # The inner stages reset the peak; the outer one still sees it
+    assert memory["outer"] >= 8 * 1024 * 1024
+    assert "_peaks" not in run
@@ -0,0 +1,16 @@
+from user_store import SqliteUserStore
+
+
+def test_unknown_usernames_are_not_cached(tmp_path):
+    store = SqliteUserStore(str(tmp_path / "users.sqlite3"))
+    store.add("admin", "hash", "admin")
+
+    for number in range(100):
+        assert store.get(f"nobody{number}") is None
+    assert store.get("admin") == {"password": "hash", "role": "admin"}
+    assert list(store._cache) == ["admin"]
+
+    # A miss is looked up again once the user exists
+    assert store.get("late") is None
+    store.add("late", "hash", "user")
+    assert store.get("late") == {"password": "hash", "role": "user"}
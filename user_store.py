@@ -0,0 +1,192 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+
+# Backend for accounts: "sqlite" (default) or the legacy "json" file
+USER_STORE_BACKEND = os.environ.get("FARM_USER_STORE", "sqlite")
+USER_DB_PATH = os.environ.get("FARM_USER_DB", "user_db.sqlite3")
+LEGACY_USER_DB_FILE = "user_db.json"
+
+
+class SqliteUserStore:
+    """Accounts in an SQLite table keyed (and indexed) by username.
+
+    Lookups of existing users are cached per process; misses are not, so
+    logins with made-up usernames cannot grow the cache. The cache is dropped on this store's own
+    writes and whenever another connection (another process) has committed
+    a change, which SQLite reports through ``PRAGMA data_version``. Writes
+    are single statements, so concurrent edits never overwrite each other.
+    """
+
+    def __init__(self, path=USER_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            "username TEXT PRIMARY KEY, password TEXT NOT NULL, role TEXT NOT NULL)"
+        )
+        self._cache = {}
+        self._data_version = None
+
+    def _fresh_cache(self):
+        data_version = self._connection.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self._data_version:
+            self._cache.clear()
+            self._data_version = data_version
+        return self._cache
+
+    def get(self, username):
+        """The user's {"password", "role"} record, or None."""
+        with self._lock:
+            cache = self._fresh_cache()
+            if username not in cache:
+                row = self._connection.execute(
+                    "SELECT password, role FROM users WHERE username = ?", (username,)
+                ).fetchone()
+                if row is None:
+                    return None
+                cache[username] = {"password": row[0], "role": row[1]}
+            return cache[username]
+
+    def count(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def page(self, offset, limit):
+        """(username, role) pairs in username order."""
+        with self._lock:
+            return self._connection.execute(
+                "SELECT username, role FROM users ORDER BY username LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+
+    def add(self, username, password_hash, role):
+        """Create a user; returns False when the username is taken."""
+        with self._lock:
+            try:
+                self._connection.execute(
+                    "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+                    (username, password_hash, role),
+                )
+            except sqlite3.IntegrityError:
+                return False
+            finally:
+                self._cache.pop(username, None)
+            return True
+
+    def add_many(self, users):
+        """Insert {username: record} users that do not exist yet, in one transaction."""
+        with self._lock:
+            with self._connection:
+                self._connection.execute("BEGIN IMMEDIATE")
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO users (username, password, role) VALUES (?, ?, ?)",
+                    [(username, record["password"], record["role"]) for username, record in users.items()],
+                )
+            self._cache.clear()
+
+    def delete(self, username):
+        with self._lock:
+            self._connection.execute("DELETE FROM users WHERE username = ?", (username,))
+            self._cache.pop(username, None)
+
+
+class JsonUserStore:
+    """Accounts in the legacy user_db.json file.
+
+    The parsed file is cached until its modification time changes. Writes
+    replace the file atomically under a process-wide lock; prefer the SQLite
+    store when several processes edit accounts.
+    """
+
+    def __init__(self, path=LEGACY_USER_DB_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._users = {}
+        self._stamp = None
+
+    def _load(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._users, self._stamp = {}, None
+            return self._users
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp != self._stamp:
+            with open(self.path, "r") as file:
+                self._users = json.load(file)
+            self._stamp = stamp
+        return self._users
+
+    def _save(self, users):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, "w") as file:
+            json.dump(users, file)
+        os.replace(tmp_path, self.path)
+        stat = os.stat(self.path)
+        self._users, self._stamp = users, (stat.st_mtime_ns, stat.st_size)
+
+    def get(self, username):
+        with self._lock:
+            return self._load().get(username)
+
+    def count(self):
+        with self._lock:
+            return len(self._load())
+
+    def page(self, offset, limit):
+        with self._lock:
+            users = self._load()
+            return [(username, users[username]["role"]) for username in sorted(users)[offset:offset + limit]]
+
+    def add(self, username, password_hash, role):
+        with self._lock:
+            users = dict(self._load())
+            if username in users:
+                return False
+            users[username] = {"password": password_hash, "role": role}
+            self._save(users)
+            return True
+
+    def add_many(self, users):
+        with self._lock:
+            merged = dict(users)
+            merged.update(self._load())
+            self._save(merged)
+
+    def delete(self, username):
+        with self._lock:
+            users = dict(self._load())
+            if users.pop(username, None) is not None:
+                self._save(users)
+
+
+def migrate_json_users(store, json_path=LEGACY_USER_DB_FILE):
+    """Copy accounts from a legacy user_db.json into a store.
+
+    Existing accounts are kept as they are, so the migration can be re-run.
+    Returns the number of accounts read from the file.
+    """
+    if not os.path.exists(json_path):
+        return 0
+    with open(json_path, "r") as file:
+        users = json.load(file)
+    store.add_many(users)
+    return len(users)
+
+
+def open_user_store(backend=USER_STORE_BACKEND, path=None):
+    if backend == "json":
+        return JsonUserStore(path or LEGACY_USER_DB_FILE)
+    if backend != "sqlite":
+        raise ValueError(f"Unknown user store backend: {backend}")
+    path = path or USER_DB_PATH
+    is_new = not os.path.exists(path)
+    store = SqliteUserStore(path)
+    if is_new:
+        migrate_json_users(store)
+    return store